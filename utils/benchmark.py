@@ -0,0 +1,387 @@
+import argparse
+import logging
+import sys
+import time
+
+from utils.duckyscript_compiler import CompiledPayload, compile_duckyscript, compile_line, elide_releases
+
+# Contoh payload yang mewakili campuran perintah pada payloads/
+SAMPLE_LINES = [
+    "REM open a terminal",
+    "GUI r",
+    "DELAY 500",
+    "STRING cmd",
+    "ENTER",
+    "STRING CTRL",
+    "CTRL ALT DELETE",
+    "TAB",
+    "F5",
+    "HOME",
+]
+
+
+def _legacy_dispatch(line):
+    # Salinan rantai if/startswith lama dari process_duckyscript (tanpa pengiriman) sebagai pembanding
+    line = line.strip()
+    if not line or line.startswith("REM"):
+        return None
+    if line.startswith("TAB"):
+        pass
+    if line.startswith("PRIVATE_BROWSER"):
+        pass
+    if line.startswith("VOLUME_UP"):
+        pass
+    if line.startswith("DELAY"):
+        return "DELAY"
+    if line.startswith("STRING"):
+        return "STRING"
+    elif any(mod in line for mod in ["SHIFT", "ALT", "CTRL", "GUI", "COMMAND", "WINDOWS"]):
+        return "COMBINATION"
+    elif line.startswith("ENTER"):
+        return "ENTER"
+    return None
+
+def _legacy_encode_keyboard_input(*args):
+    # Salinan encode_keyboard_input lama dari CLI.py sebagai pembanding
+    from utils.magic_keyboard_hid import Key_Codes, Modifier_Codes
+
+    keycodes = []
+    flags = 0
+    for a in args:
+        if isinstance(a, Key_Codes):
+            keycodes.append(a.value)
+        elif isinstance(a, Modifier_Codes):
+            flags |= a.value
+    assert(len(keycodes) <= 7)
+    keycodes += [0] * (7 - len(keycodes))
+    return bytes([0xa1, 0x01, flags, 0x00] + keycodes)
+
+def _time_per_call(func, items, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for item in items:
+            func(item)
+    elapsed = time.perf_counter() - start
+    return elapsed / (rounds * len(items))
+
+def bench_dispatch(rounds=20000):
+    from utils import duckyscript_compiler
+
+    # Hanya biaya dispatch: handler diganti no-op supaya encoding tidak ikut terukur
+    handlers = dict(duckyscript_compiler.COMMANDS)
+    noop = lambda payload, command, argument, layout: None
+    duckyscript_compiler.COMMANDS.update({name: noop for name in handlers})
+    try:
+        payload = CompiledPayload()
+        table = _time_per_call(lambda line: compile_line(payload, line), SAMPLE_LINES, rounds)
+    finally:
+        duckyscript_compiler.COMMANDS.update(handlers)
+    chain = _time_per_call(_legacy_dispatch, SAMPLE_LINES, rounds)
+
+    print(f"startswith chain : {chain * 1e9:8.0f} ns/line")
+    print(f"dispatch table   : {table * 1e9:8.0f} ns/line")
+    print(f"speedup          : {chain / table:8.2f}x")
+
+def bench_string(size=1 << 20):
+    from utils import duckyscript_compiler
+
+    if duckyscript_compiler.np is None:
+        print("NumPy is not installed, only the per-character encoder is available")
+        return
+    # 1 MB teks campuran huruf besar/kecil, angka dan tanda baca dalam satu STRING
+    sample = "The quick brown fox jumps over the lazy dog 0123456789, (OK)! "
+    text = (sample * (size // len(sample) + 1))[:size]
+
+    batch = CompiledPayload()
+    start = time.perf_counter()
+    duckyscript_compiler._compile_string(batch, text, 'us')
+    batch_time = time.perf_counter() - start
+
+    numpy = duckyscript_compiler.np
+    duckyscript_compiler.np = None
+    try:
+        scalar = CompiledPayload()
+        start = time.perf_counter()
+        duckyscript_compiler._compile_string(scalar, text, 'us')
+        scalar_time = time.perf_counter() - start
+    finally:
+        duckyscript_compiler.np = numpy
+    assert batch.reports == scalar.reports and batch.delays == scalar.delays
+
+    print(f"text             : {len(text)} chars, {len(batch)} reports")
+    print(f"per character    : {scalar_time * 1000:8.1f} ms")
+    print(f"numpy batch      : {batch_time * 1000:8.1f} ms")
+    print(f"speedup          : {scalar_time / batch_time:8.2f}x")
+
+def bench_elide():
+    # Jumlah paket L2CAP untuk teks biasa, dengan dan tanpa release di antara tombol
+    lines = ["STRING The quick brown fox jumps over the lazy dog, 1234567890!", "ENTER"] * 100 + SAMPLE_LINES
+    program = compile_duckyscript(lines)
+    elided = list(elide_releases(program.iter_from(0)))
+    duration = sum(delay for _, _, delay in elided)
+
+    print(f"reports          : {len(program):8d}  ({program.total_duration():.3f}s)")
+    print(f"release-elided   : {len(elided):8d}  ({duration:.3f}s)")
+    print(f"packets saved    : {1 - len(elided) / len(program):8.1%}")
+
+def bench_encode(rounds=200):
+    from utils import duckyscript_compiler
+    from utils.keyboard_layouts import LAYOUTS
+    from utils.magic_keyboard_hid import Key_Codes, Modifier_Codes
+
+    # Setiap karakter layout 'us' sebagai press report: Enum (cara lama), Enum lewat cache, integer lewat cache
+    strokes = [stroke for entry in LAYOUTS['us'].values() for stroke in entry]
+    modifier_members = {member.value: member for member in Modifier_Codes}
+    key_members = {member.value: member for member in Key_Codes}
+    members = [((modifier_members[modifiers],) if modifiers else ()) + (key_members[keycode],)
+               for modifiers, keycode in strokes]
+    for members_args, (modifiers, keycode) in zip(members, strokes):
+        assert _legacy_encode_keyboard_input(*members_args) == duckyscript_compiler.encode_report(modifiers, keycode)
+
+    legacy = _time_per_call(lambda args: _legacy_encode_keyboard_input(*args), members, rounds)
+    cached_members = _time_per_call(lambda args: duckyscript_compiler.encode_keys(*args), members, rounds)
+    cached = _time_per_call(lambda stroke: duckyscript_compiler.encode_report(*stroke), strokes, rounds)
+    print(f"Enum + bytes()   : {1 / legacy:12,.0f} reports/s")
+    print(f"Enum, interned   : {1 / cached_members:12,.0f} reports/s")
+    print(f"int, interned    : {1 / cached:12,.0f} reports/s")
+    print(f"speedup          : {legacy / cached:8.2f}x")
+
+def _legacy_attempt_send(sock, data, timeout=0.5):
+    # Salinan L2CAPClient.attempt_send lama: coba ulang setiap 1 ms selama buffer penuh
+    start = time.time()
+    while time.time() - start < timeout:
+        try:
+            sock.send(data)
+            return
+        except BlockingIOError:
+            time.sleep(0.001)
+
+def _legacy_recv(sock, timeout=0):
+    # Salinan L2CAPClient.recv lama: spin tanpa sleep selama timeout belum habis
+    start = time.time()
+    while True:
+        try:
+            return sock.recv(64)
+        except BlockingIOError:
+            if (time.time() - start) < timeout:
+                continue
+        return None
+
+def bench_send(reports=10000, drain_interval=0.0002, recv_timeout=0.2):
+    import socket
+    import threading
+    from utils.duckyscript_compiler import RELEASE_REPORT, encode_report
+    from utils.l2cap_io import SocketPoller, send_when_writable
+
+    # Link jenuh: penerima (pengganti host) membaca satu report setiap drain_interval, pengirim
+    # mengirim tanpa jeda. Yang diukur waktu CPU thread pengirim per 10k report
+    def run(send):
+        sender, receiver = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        sender.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+        sender.setblocking(False)
+
+        def drain():
+            for _ in range(reports):
+                receiver.recv(64)
+                time.sleep(drain_interval)
+        reader = threading.Thread(target=drain)
+        reader.start()
+        frames = [encode_report(0, 0x04 + i % 26) if i % 2 == 0 else RELEASE_REPORT for i in range(reports)]
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        for frame in frames:
+            send(sender, frame)
+        cpu = time.thread_time() - cpu
+        reader.join()
+        wall = time.perf_counter() - wall
+        sender.close()
+        receiver.close()
+        return cpu * 10000 / reports, wall
+
+    legacy_cpu, legacy_wall = run(_legacy_attempt_send)
+    poller = {}
+    def poll_send(sock, frame):
+        send_when_writable(sock, poller.setdefault(sock, SocketPoller(sock)), frame)
+    poll_cpu, poll_wall = run(poll_send)
+    print(f"sleep(1 ms) loop : {legacy_cpu * 1000:8.1f} ms CPU / 10k reports  ({legacy_wall:.2f}s wall)")
+    print(f"poll() wait      : {poll_cpu * 1000:8.1f} ms CPU / 10k reports  ({poll_wall:.2f}s wall)")
+
+    # Menunggu report LED yang tidak pernah datang; jalur yang dipakai adalah sock_recv event loop seperti
+    # di AsyncL2CAPClient.recv
+    import asyncio
+    from utils.l2cap_io import RECV_SIZE
+    idle, _ = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    idle.setblocking(False)
+
+    async def loop_recv():
+        try:
+            return await asyncio.wait_for(asyncio.get_running_loop().sock_recv(idle, RECV_SIZE), recv_timeout)
+        except asyncio.TimeoutError:
+            return None
+    for name, wait in (("spin recv", lambda: _legacy_recv(idle, recv_timeout)),
+                       ("asyncio recv", lambda: asyncio.run(loop_recv()))):
+        cpu = time.thread_time()
+        wait()
+        cpu = time.thread_time() - cpu
+        print(f"{name:16} : {cpu * 1000:8.1f} ms CPU for a {recv_timeout * 1000:.0f} ms receive timeout")
+    idle.close()
+
+def bench_plan():
+    from utils import duckyscript_compiler
+
+    # Jumlah report dan total delay per mode encoder untuk teks campuran huruf besar/kecil
+    lines = ["STRING The QUICK Brown FOX-JUMPS_OVER.THE.LAZY.DOG 1234 !@#$", "STRINGLN HELLO WORLD FROM BLUEDUCKY"] * 50
+    for plan in (False, True):
+        duckyscript_compiler.set_keystroke_planning(plan)
+        program = compile_duckyscript(lines)
+        elided = list(elide_releases(program.iter_from(0)))
+        name = "planner" if plan else "per character"
+        print(f"{name:16} : {len(program):6d} reports {program.total_duration():7.3f}s, {len(elided):6d} with release elision")
+    duckyscript_compiler.set_keystroke_planning(False)
+
+def _keydowns(reports):
+    # Model host: tombol baru pada array diproses per slot, pada bitmap NKRO mulai dari usage terkecil
+    from utils.duckyscript_compiler import NKRO_REPORT_ID, NKRO_USAGE_COUNT
+
+    events = []
+    held = {}
+    for report in reports:
+        if report[1] == NKRO_REPORT_ID:
+            keys = [usage for usage in range(NKRO_USAGE_COUNT) if report[3 + usage // 8] >> (usage % 8) & 1]
+        else:
+            keys = [keycode for keycode in report[4:] if keycode]
+        previous = held.get(report[1], [])
+        events.extend((report[2], keycode) for keycode in keys if keycode not in previous)
+        held[report[1]] = keys
+    return events
+
+def bench_nkro():
+    from utils import duckyscript_compiler
+
+    # Report boot (satu tombol per report) dibandingkan dengan report bitmap NKRO untuk teks biasa
+    lines = ["STRING The quick brown fox jumps over the lazy dog, 1234567890!", "ENTER",
+             "STRINGLN abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ"] * 100 + SAMPLE_LINES
+    programs = {}
+    for mode in duckyscript_compiler.REPORT_MODES:
+        duckyscript_compiler.set_report_mode(mode)
+        program = programs[mode] = compile_duckyscript(lines)
+        size = sum(len(report) for report in program.reports)
+        print(f"{mode:16} : {len(program):6d} reports {size:7d} bytes {program.total_duration():7.3f}s")
+    duckyscript_compiler.set_report_mode('boot')
+    elided = [report for _, report, _ in elide_releases(programs['boot'].iter_from(0))]
+    print(f"{'boot, elided':16} : {len(elided):6d} reports {sum(map(len, elided)):7d} bytes")
+    assert _keydowns(programs['boot'].reports) == _keydowns(programs['nkro'].reports)
+    print(f"packets saved    : {1 - len(programs['nkro']) / len(programs['boot']):8.1%} (same key sequence on the host)")
+
+def _legacy_send(sock, data):
+    # Salinan L2CAPClient.send lama: timestamp dan hexlify untuk log.debug di setiap report
+    import binascii
+    import datetime
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    logging.debug(f"[{timestamp}][TX-19] Attempting to send data: {binascii.hexlify(data).decode()}")
+    _legacy_attempt_send(sock, data)
+    logging.debug("[TX-19] Data sent successfully")
+
+def bench_jitter(repeat=20, delay=0.002):
+    import socket
+    import struct
+    import threading
+    from utils.duckyscript_compiler import CompiledPayload, compile_line
+    from utils.report_sender import SWITCH_INTERVAL, ReportRing, ReportSender
+
+    # Parsing dan pengiriman di thread yang sama dibandingkan dengan ReportSender yang diisi lewat ring.
+    # Semua report diberi jeda yang sama, jadi jitter = selisih jarak antar report dengan jeda itu. Waktu
+    # kirim diambil dari timestamp kernel (SO_TIMESTAMPNS), bukan dari kapan thread penerima bangun
+    lines = ["STRING The quick brown fox jumps over the lazy dog", "STRINGLN ABCDEFGHIJKLMNOPQRSTUVWXYZ 0123456789"] * repeat
+
+    def blocks():
+        for line in lines:
+            block = CompiledPayload()
+            compile_line(block, line)
+            yield block
+
+    def run(produce):
+        sender, receiver = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        sender.setblocking(False)
+        # Konstanta Linux, tidak selalu diekspor modul socket
+        receiver.setsockopt(socket.SOL_SOCKET, getattr(socket, 'SO_TIMESTAMPNS', 35), 1)
+        arrivals = []
+        def receive():
+            while True:
+                data, ancillary, _, _ = receiver.recvmsg(64, socket.CMSG_SPACE(16))
+                if not data:
+                    return
+                seconds, nanoseconds = struct.unpack('qq', ancillary[0][2])
+                arrivals.append(seconds + nanoseconds / 1e9)
+        reader = threading.Thread(target=receive)
+        reader.start()
+        produce(sender)
+        sender.close()
+        reader.join()
+        receiver.close()
+        errors = sorted(abs(b - a - delay) for a, b in zip(arrivals, arrivals[1:]))
+        return sum(errors) / len(errors), errors[int(len(errors) * 0.99)]
+
+    def inline(sock):
+        for block in blocks():
+            for report in block.reports:
+                _legacy_send(sock, report)
+                time.sleep(delay)
+
+    def ring(sock):
+        # Switch interval diatur seperti di HIDEngine.connect
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, SWITCH_INTERVAL))
+        queue = ReportRing()
+        report_sender = ReportSender(sock, queue)
+        report_sender.start()
+        try:
+            for block in blocks():
+                for report in block.reports:
+                    while not queue.put(None, report, delay):
+                        queue.wait_space()
+            queue.wait_empty()
+            report_sender.stop()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+    for name, produce in (("inline send", inline), ("ring + sender", ring)):
+        mean, p99 = run(produce)
+        print(f"{name:16} : mean {mean * 1e6:7.1f} us, p99 {p99 * 1e6:7.1f} us off a {delay * 1000:.0f} ms schedule")
+
+def bench_vm(iterations=1000):
+    from utils.duckyscript_compiler import START_DELAY
+    from utils.duckyscript_vm import compile_program
+
+    # DELAY sebelum WHILE hanya dijalankan sekali, bukan di setiap iterasi
+    program = compile_program(["VAR $i = 0", "DELAY 1000", "WHILE ($i < 3)", "DELAY 500", "$i = ($i + 1)", "END_WHILE"])
+    duration = sum(delay for _, _, delay in program.iter_from(0))
+    assert abs(duration - (START_DELAY + 1.0 + 3 * 0.5)) < 0.01, duration
+
+    program = compile_program(["VAR $i = 0", "WHILE ($i < %d)" % iterations, "STRING ab", "$i = ($i + 1)", "END_WHILE"])
+    start = time.perf_counter()
+    reports = sum(1 for _ in program.iter_from(0))
+    elapsed = time.perf_counter() - start
+    print(f"WHILE loop       : {reports} reports in {elapsed * 1000:.1f} ms ({reports / elapsed:,.0f} reports/s)")
+
+BENCHMARKS = {
+    'dispatch': bench_dispatch,
+    'encode': bench_encode,
+    'string': bench_string,
+    'elide': bench_elide,
+    'plan': bench_plan,
+    'send': bench_send,
+    'nkro': bench_nkro,
+    'jitter': bench_jitter,
+    'vm': bench_vm,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='BlueDucky encoder benchmarks')
+    parser.add_argument('name', choices=sorted(BENCHMARKS), help='Benchmark to run')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    BENCHMARKS[args.name]()
+
+if __name__ == "__main__":
+    main()
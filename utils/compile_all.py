@@ -0,0 +1,98 @@
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils.duckyscript_compiler import REPORT_MODES, set_keystroke_planning, set_report_mode
+from utils.duckyscript_vm import DuckyScriptError
+from utils.keyboard_layouts import LAYOUTS
+from utils.macros import DEFAULT_OS, TARGET_OSES, select_target_os
+from utils.payload_cache import CACHE_DIR, MappedPayload, _payload_features, precompile_payload
+from utils.payload_template import TemplatePayload
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'payloads')
+
+
+def list_payloads(payload_dir=PAYLOAD_DIR):
+    # Sama dengan daftar payload di GNOME.py, hanya file biasa
+    return sorted(os.path.join(payload_dir, name) for name in os.listdir(payload_dir)
+                  if os.path.isfile(os.path.join(payload_dir, name)))
+
+def compile_payload(filename, layout, cache_dir=CACHE_DIR, target_os=DEFAULT_OS, plan_keystrokes=False, report_mode='boot'):
+    # Dijalankan di proses worker; hanya ringkasan yang dikirim balik, bukan programnya.
+    # Hasilnya (payload, layout, waktu, ringkasan, error, masuk cache)
+    select_target_os(target_os)
+    set_keystroke_planning(plan_keystrokes)
+    set_report_mode(report_mode)
+    start = time.perf_counter()
+    stringfile, control_flow, template = _payload_features(filename)
+    if stringfile or (template and control_flow):
+        # precompile_payload tidak menyimpan payload ini dan hanya akan mengompilasinya penuh di memori
+        # (STRINGFILE ratusan MB) atau gagal karena slot template belum diisi
+        reason = "STRINGFILE" if stringfile else "template + control flow"
+        return filename, layout, time.perf_counter() - start, f"not cacheable ({reason})", None, False
+    try:
+        program = precompile_payload(filename, layout, cache_dir)
+    except DuckyScriptError as e:
+        return filename, layout, time.perf_counter() - start, None, str(e), False
+    elapsed = time.perf_counter() - start
+    if isinstance(program, MappedPayload):
+        summary = f"{len(program)} reports"
+        program.close()
+    elif isinstance(program, TemplatePayload):
+        summary = f"template, slots: {', '.join(sorted(program.slots()))}"
+    else:
+        # Program VM berisi WHILE, jadi jumlah report tidak dihitung
+        summary = "compiled"
+    return filename, layout, elapsed, summary, None, True
+
+def compile_all(payloads, layouts, jobs=None, cache_dir=CACHE_DIR, target_os=DEFAULT_OS, plan_keystrokes=False,
+                report_mode='boot'):
+    # Semua kombinasi payload x layout dikompilasi paralel ke cache di disk
+    jobs = jobs or os.cpu_count()
+    os.makedirs(cache_dir, exist_ok=True)
+    start = time.perf_counter()
+    failed = skipped = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(compile_payload, filename, layout, cache_dir, target_os, plan_keystrokes, report_mode)
+                   for filename in payloads for layout in layouts]
+        for future in as_completed(futures):
+            filename, layout, elapsed, summary, error, cached = future.result()
+            name = os.path.basename(filename)
+            if error:
+                failed += 1
+                print(f"❌ {name} [{layout}] {elapsed * 1000:8.1f} ms  {error}")
+            elif not cached:
+                # Bukan kegagalan: payload ini dikompilasi saat dijalankan
+                skipped += 1
+                print(f"➖ {name} [{layout}] {elapsed * 1000:8.1f} ms  {summary}")
+            else:
+                print(f"✅ {name} [{layout}] {elapsed * 1000:8.1f} ms  {summary}")
+    total = time.perf_counter() - start
+    compiled = len(futures) - skipped
+    print(f"Compiled {compiled - failed}/{compiled} payloads in {total:.2f}s using {jobs} processes, "
+          f"{skipped} not cacheable")
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompile every payload into the compiled payload cache')
+    parser.add_argument('--payloads', default=PAYLOAD_DIR, help='Directory containing the duckyscript payloads')
+    parser.add_argument('--layout', action='append', choices=sorted(LAYOUTS),
+                        help='Keyboard layout to compile for (repeatable, default: all layouts)')
+    parser.add_argument('--os', default=DEFAULT_OS, choices=TARGET_OSES, help='Target operating system for the shortcut macros')
+    parser.add_argument('--plan-keystrokes', action='store_true', help='Compile with the Shift/Caps Lock keystroke planner')
+    parser.add_argument('--report-mode', default='boot', choices=REPORT_MODES, help='Keyboard report the payloads are compiled for')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='Number of worker processes')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    if not os.path.isdir(args.payloads):
+        print(f"❌ Payload directory not found: {args.payloads}")
+        raise SystemExit(1)
+    if compile_all(list_payloads(args.payloads), args.layout or sorted(LAYOUTS), args.jobs, target_os=args.os,
+                   plan_keystrokes=args.plan_keystrokes, report_mode=args.report_mode):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
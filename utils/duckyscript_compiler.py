@@ -0,0 +1,859 @@
+import codecs
+import hashlib
+import logging as log
+import os
+
+from utils.hid_descriptor import (BOOT_DESCRIPTOR, HID_DESCRIPTORS, DescriptorMismatch, consumer_encoder, decode_report,
+                                  keyboard_encoder, nkro_encoder, parse_descriptor, report_layout)
+from utils.keyboard_layouts import LAYOUTS
+from utils.macros import macro_fingerprint, macro_lines, macro_names, target_os
+from utils.magic_keyboard_hid import KEYCODES, MEMBER_CODES, MODIFIERS, SHIFTED_KEY_NAMES
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy opsional: tanpa NumPy setiap STRING di-encode per karakter
+    np = None
+
+# Dinaikkan setiap kali format report yang dihasilkan berubah
+ENCODER_VERSION = 14
+
+# Format report diturunkan dari report descriptor yang didaftarkan lewat SDP (hid_descriptor.py).
+# Deskriptor mode 'nkro' memuat semua report yang bisa dihasilkan encoder; verify_encoder()
+# memeriksa hasil encoder terhadap deskriptor mode yang dipakai
+REPORT_LAYOUT = report_layout(HID_DESCRIPTORS['nkro'])
+
+# 0xa1 = HIDP DATA | Input
+REPORT_HEADER = 0xa1
+KEYBOARD_REPORT_ID = REPORT_LAYOUT.keyboard_id
+KEYCODE_SLOTS = REPORT_LAYOUT.key_slots
+MAX_REPORT_LENGTH = REPORT_LAYOUT.keyboard_length
+# Posisi byte modifier dan array keycode di dalam frame report keyboard
+MODIFIER_OFFSET = REPORT_LAYOUT.modifier_offset
+KEY_OFFSET = REPORT_LAYOUT.key_offset
+KEYS = slice(KEY_OFFSET, KEY_OFFSET + KEYCODE_SLOTS)
+
+# Report NKRO: byte modifier lalu bitmap satu bit per usage, jadi jumlah tombol per report tidak dibatasi slot
+NKRO_REPORT_ID = REPORT_LAYOUT.nkro_id
+NKRO_USAGE_COUNT = REPORT_LAYOUT.nkro_usage_count
+NKRO_REPORT_LENGTH = REPORT_LAYOUT.nkro_length
+# Report consumer control: satu usage 16 bit dari page 0x0C
+CONSUMER_REPORT_ID = REPORT_LAYOUT.consumer_id
+
+# 'boot': satu tombol per report (array keycode), 'nkro': STRING dikemas ke report bitmap
+REPORT_MODES = ('boot', 'nkro')
+
+# Delay yang sama dengan send_keypress / send_keyboard_combination di CLI.py
+KEYPRESS_DELAY = 0.0001
+COMBINATION_DELAY = 0.004
+START_DELAY = 0.5
+
+# Jumlah report yang ditahan di memori saat kompilasi streaming
+STREAM_WINDOW = 4096
+# STRING sepanjang ini atau lebih di-encode sekaligus dengan NumPy (jika tersedia)
+BATCH_MIN_LENGTH = 64
+
+# Release hanya dibuang jika tombol sebelumnya ditahan paling lama selama ini (di bawah jeda auto-repeat)
+ELIDE_MAX_HOLD = 0.02
+
+# Perkiraan waktu kirim satu report lewat L2CAP; planner menimbang jumlah report terhadap total delay
+PLAN_REPORT_COST = 0.001
+
+# Layout di mana Caps Lock hanya membalik huruf; karakter ASCII lain tetap sama meski Caps Lock aktif
+CAPS_LETTERS_ONLY_LAYOUTS = {'us', 'uk', 'de', 'id'}
+
+# Opsi encoder yang mengubah hasil kompilasi (ikut dalam encoder_fingerprint)
+ENCODER_OPTIONS = {'plan_keystrokes': False, 'report_mode': 'boot'}
+
+# Ukuran potongan file STRINGFILE yang dibaca dan di-encode sekaligus
+STRINGFILE_CHUNK_SIZE = 1 << 14
+
+
+# Report yang sudah pernah di-encode, dikunci (modifier, keycodes) dan juga isi bytes-nya sendiri:
+# setiap tombol yang sama memakai objek bytes yang sama, baik di program hasil kompilasi (termasuk
+# jalur batch NumPy) maupun saat dikirim
+_REPORTS = {}
+_encode_keyboard = keyboard_encoder(REPORT_LAYOUT)
+_encode_nkro = nkro_encoder(REPORT_LAYOUT)
+_encode_consumer = consumer_encoder(REPORT_LAYOUT)
+
+def _intern(report):
+    return _REPORTS.setdefault(report, report)
+
+def encode_report(modifiers=0, *keycodes):
+    report = _REPORTS.get((modifiers, keycodes))
+    if report is None:
+        report = _REPORTS[modifiers, keycodes] = _intern(_encode_keyboard(modifiers, keycodes))
+    return report
+
+RELEASE_REPORT = encode_report()
+
+_MEMBER_REPORTS = {}
+
+def encode_keys(*members):
+    # Pengganti encode_keyboard_input lama untuk argumen Key_Codes/Modifier_Codes; report di-cache per
+    # kombinasi, bukan dibuat ulang setiap kali tombol dikirim
+    report = _MEMBER_REPORTS.get(members)
+    if report is None:
+        modifiers = 0
+        keycodes = []
+        for member in members:
+            modifier, keycode = MEMBER_CODES[member]
+            modifiers |= modifier
+            if keycode:
+                keycodes.append(keycode)
+        report = _MEMBER_REPORTS[members] = encode_report(modifiers, *keycodes)
+    return report
+
+def encode_nkro_report(modifiers=0, *keycodes):
+    key = (NKRO_REPORT_ID, modifiers, keycodes)
+    report = _REPORTS.get(key)
+    if report is None:
+        report = _REPORTS[key] = _intern(_encode_nkro(modifiers, keycodes))
+    return report
+
+NKRO_RELEASE_REPORT = encode_nkro_report()
+
+def encode_consumer_report(usage=0):
+    return _encode_consumer(usage)
+
+CONSUMER_RELEASE_REPORT = encode_consumer_report()
+
+# Host yang memilih boot protocol (SET_PROTOCOL) membaca frame boot keyboard dengan report ID 0x01:
+# a1 01 <modifier> <reserved> <6 keycode>. Report consumer tidak punya padanan boot dan dibuang (None)
+BOOT_LAYOUT = report_layout(BOOT_DESCRIPTOR)
+_encode_boot = keyboard_encoder(BOOT_LAYOUT)
+_BOOT_REPORTS = {}
+
+def _to_boot_report(report):
+    if report[1] == KEYBOARD_REPORT_ID:
+        return _encode_boot(report[MODIFIER_OFFSET], report[KEYS])
+    if report[1] == NKRO_REPORT_ID:
+        bitmap = report[REPORT_LAYOUT.nkro_bitmap_offset:]
+        keycodes = [usage for usage in range(NKRO_USAGE_COUNT) if bitmap[usage >> 3] >> (usage & 7) & 1]
+        if len(keycodes) > BOOT_LAYOUT.key_slots:
+            # Lebih dari 6 tombol: boot report melaporkan ErrorRollOver (usage 0x01) di semua slot
+            keycodes = [0x01] * BOOT_LAYOUT.key_slots
+        return _encode_boot(report[REPORT_LAYOUT.nkro_modifier_offset], keycodes)
+    return None
+
+def boot_report(report):
+    try:
+        return _BOOT_REPORTS[report]
+    except KeyError:
+        boot = _BOOT_REPORTS[report] = _to_boot_report(report)
+        return boot
+
+# Keycode MEDIA* di magic_keyboard_hid.py bukan usage keyboard yang valid, jadi dikirim sebagai
+# usage consumer control (HID Usage Tables, page 0x0C)
+CONSUMER_USAGES = {
+    KEYCODES['MEDIAPLAYPAUSE']: 0x0cd,
+    KEYCODES['MEDIASTOPCD']: 0x0b7,
+    KEYCODES['MEDIAPREV']: 0x0b6,
+    KEYCODES['MEDIANEXT']: 0x0b5,
+    KEYCODES['MEDIAEJECTCD']: 0x0b8,
+    KEYCODES['MEDIAVOLUMEUP']: 0x0e9,
+    KEYCODES['MEDIAVOLUMEDOWN']: 0x0ea,
+    KEYCODES['MEDIAMUTE']: 0x0e2,
+    KEYCODES['MEDIAWEBBROWSER']: 0x196,
+    KEYCODES['MEDIABACK']: 0x224,
+    KEYCODES['MEDIAFORWARD']: 0x225,
+    KEYCODES['MEDIASTOP']: 0x226,
+    KEYCODES['MEDIAFIND']: 0x221,
+    KEYCODES['MEDIASCROLLUP']: 0x233,
+    KEYCODES['MEDIASCROLLDOWN']: 0x234,
+    KEYCODES['MEDIAEDIT']: 0x185,
+    KEYCODES['MEDIASLEEP']: 0x032,
+    KEYCODES['MEDIACOFFEE']: 0x19e,
+    KEYCODES['MEDIAREFRESH']: 0x227,
+    KEYCODES['MEDIACALC']: 0x192,
+}
+
+def verify_encoder(mode='boot'):
+    # Self-check saat start: setiap jenis report yang dikirim pada mode ini dibaca ulang dengan field
+    # dari deskriptor yang akan didaftarkan, begitu juga padanan boot protocol-nya dengan format boot.
+    # DescriptorMismatch jika host akan membacanya berbeda
+    formats = parse_descriptor(HID_DESCRIPTORS[mode])
+    modifiers = MODIFIERS['CTRL'] | MODIFIERS['RIGHTALT']
+    modifier_usages = [0xe0, 0xe6]
+    keys = list(range(KEYCODES['a'], KEYCODES['a'] + KEYCODE_SLOTS))
+    # Ujung rentang yang bisa dihasilkan compiler: semua modifier, keycode terendah dan tertinggi di KEY_TABLE
+    # yang dikirim lewat array keyboard (tombol media lewat consumer control), usage consumer terendah dan
+    # tertinggi. decode_report menolak nilai di luar logical range deskriptor
+    all_modifiers = list(range(0xe0, 0xe8))
+    keyboard_keys = sorted({keycode for keycode in KEY_TABLE.values() if keycode and keycode not in CONSUMER_USAGES})
+    extremes = [keyboard_keys[0], keyboard_keys[-1]]
+    consumer_usages = sorted(CONSUMER_USAGES.values())
+    checks = [
+        (encode_report(modifiers, *keys), {0x07: sorted(keys + modifier_usages)}),
+        (encode_report(0xff, *extremes), {0x07: extremes + all_modifiers}),
+        (RELEASE_REPORT, {}),
+        (encode_consumer_report(CONSUMER_USAGES[KEYCODES['MEDIAVOLUMEUP']]), {0x0c: [0xe9]}),
+        (encode_consumer_report(consumer_usages[0]), {0x0c: [consumer_usages[0]]}),
+        (encode_consumer_report(consumer_usages[-1]), {0x0c: [consumer_usages[-1]]}),
+        (CONSUMER_RELEASE_REPORT, {}),
+    ]
+    if mode == 'nkro':
+        keys = [KEYCODES['a'], KEYCODES['SPACE'], NKRO_USAGE_COUNT - 1]
+        checks.append((encode_nkro_report(modifiers, *keys), {0x07: sorted(keys + modifier_usages)}))
+        extremes = [keyboard_keys[0], NKRO_USAGE_COUNT - 1]
+        checks.append((encode_nkro_report(0xff, *extremes), {0x07: extremes + all_modifiers}))
+        checks.append((NKRO_RELEASE_REPORT, {}))
+    for report, expected in checks:
+        decoded = decode_report(formats, report)
+        if decoded != expected:
+            raise DescriptorMismatch(f"Report {report.hex()} is read as {decoded} by the {mode} descriptor, expected {expected}")
+        boot = boot_report(report)
+        if boot is None:
+            continue
+        decoded = decode_report(BOOT_LAYOUT.formats, boot)
+        if decoded != expected:
+            raise DescriptorMismatch(f"Boot report {boot.hex()} is read as {decoded}, expected {expected}")
+
+class CompiledPayload:
+    # Program HID yang sudah jadi: reports[i] dikirim apa adanya, lalu tunggu delays[i] detik
+    def __init__(self):
+        self.reports = []
+        self.delays = []
+        # DELAY sebelum report pertama; ditambahkan ke report sebelumnya saat blok disambung
+        self.leading_delay = 0.0
+        # Karakter/perintah yang dilewati karena tidak didukung encoder
+        self.issues = []
+
+    def __len__(self):
+        return len(self.reports)
+
+    def append(self, report, delay=0.0):
+        self.reports.append(report)
+        self.delays.append(delay)
+
+    def add_delay(self, seconds):
+        if self.delays:
+            self.delays[-1] += seconds
+        else:
+            self.leading_delay += seconds
+
+    def extend(self, block):
+        if block.leading_delay:
+            self.add_delay(block.leading_delay)
+        self.reports.extend(block.reports)
+        self.delays.extend(block.delays)
+        self.issues.extend(block.issues)
+
+    def materialize(self):
+        # Untuk blok yang dikirim sendiri: DELAY di awal menjadi report kosong dengan delay tersebut
+        if self.leading_delay:
+            self.reports.insert(0, RELEASE_REPORT)
+            self.delays.insert(0, self.leading_delay)
+            self.leading_delay = 0.0
+        return self
+
+    def iter_from(self, index=0):
+        return zip(range(index, len(self.reports)), self.reports[index:], self.delays[index:])
+
+    def total_duration(self):
+        return self.leading_delay + sum(self.delays)
+
+
+def _issue(payload, message):
+    log.warning(message)
+    payload.issues.append(message)
+
+def _press(payload, modifiers, *keycodes):
+    # Timing sama dengan send_keyboard_combination (dengan modifier) / send_keypress (tanpa modifier)
+    if modifiers:
+        payload.append(encode_report(modifiers, *keycodes), COMBINATION_DELAY)
+        payload.append(RELEASE_REPORT, COMBINATION_DELAY)
+    else:
+        payload.append(encode_report(0, *keycodes), KEYPRESS_DELAY)
+        payload.append(RELEASE_REPORT, KEYPRESS_DELAY * 2)
+
+_BATCH_TABLES = {}
+
+def _batch_table(layout):
+    # Tabel per code point untuk karakter yang cukup satu stroke: keycode, modifier, dan mask valid
+    table = _BATCH_TABLES.get(layout)
+    if table is None:
+        strokes = {ord(char): entry[0] for char, entry in LAYOUTS[layout].items() if len(entry) == 1}
+        size = max(strokes) + 1
+        keycodes = np.zeros(size, np.uint8)
+        modifiers = np.zeros(size, np.uint8)
+        valid = np.zeros(size, bool)
+        for code, (modifier, keycode) in strokes.items():
+            keycodes[code] = keycode
+            modifiers[code] = modifier
+            valid[code] = True
+        table = _BATCH_TABLES[layout] = (keycodes, modifiers, valid)
+    return table
+
+def encode_string_batch(text, layout='us'):
+    # Seluruh STRING menjadi array (2N, MAX_REPORT_LENGTH) dengan baris press dan release
+    # berselang-seling, plus array delay. None jika ada karakter yang butuh jalur per karakter
+    keycodes, modifiers, valid = _batch_table(layout)
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+    if not len(codes) or codes.max() >= len(valid) or not valid[codes].all():
+        return None
+    pressed = modifiers[codes]
+    reports = np.zeros((2 * len(codes), MAX_REPORT_LENGTH), np.uint8)
+    reports[:, 0] = REPORT_HEADER
+    reports[:, 1] = KEYBOARD_REPORT_ID
+    reports[0::2, MODIFIER_OFFSET] = pressed
+    reports[0::2, KEY_OFFSET] = keycodes[codes]
+    # Timing sama dengan _press
+    delays = np.empty(2 * len(codes))
+    delays[0::2] = np.where(pressed != 0, COMBINATION_DELAY, KEYPRESS_DELAY)
+    delays[1::2] = np.where(pressed != 0, COMBINATION_DELAY, KEYPRESS_DELAY * 2)
+    return reports, delays
+
+def _compile_string_batch(payload, text, layout):
+    batch = encode_string_batch(text, layout)
+    if batch is None:
+        return False
+    reports, delays = batch
+    # Setiap baris dibaca sebagai satu nilai void sehingga tolist() langsung menghasilkan bytes,
+    # lalu diganti objek yang sudah di-intern
+    payload.reports.extend(map(_intern, reports.view(f"V{MAX_REPORT_LENGTH}").ravel().tolist()))
+    payload.delays.extend(delays.tolist())
+    return True
+
+_KEYPAD_DIGITS = [KEYCODES[f"KEYPAD{digit}"] for digit in range(10)]
+_US_HEX_DIGITS = {char: LAYOUTS['us'][char][0][1] for char in "0123456789abcdef"}
+
+def _hold_sequence(payload, modifiers, keycodes):
+    # Modifier tetap ditahan selama semua tombol diketik, baru dilepas di akhir
+    for keycode in keycodes:
+        payload.append(encode_report(modifiers, keycode), COMBINATION_DELAY)
+        payload.append(encode_report(modifiers), COMBINATION_DELAY)
+    payload.append(RELEASE_REPORT, COMBINATION_DELAY)
+
+# Encoder input Unicode mengembalikan False jika karakter tidak bisa diketik dengan metode OS tersebut
+
+def _unicode_linux(payload, char, layout):
+    # GTK/IBus: Ctrl+Shift+U, kode hex (diketik dengan layout target), lalu SPACE
+    char_table = LAYOUTS[layout]
+    _press(payload, MODIFIERS['CTRL'] | MODIFIERS['SHIFT'], KEYCODES['u'])
+    for digit in f"{ord(char):x}":
+        for modifiers, keycode in char_table[digit]:
+            _press(payload, modifiers, keycode)
+    _press(payload, 0, KEYCODES['SPACE'])
+    return True
+
+def _unicode_windows(payload, char, layout):
+    # Alt + 0 + kode desimal di numpad dibaca sebagai ANSI (Latin-1). Tanpa awalan 0 kode dibaca lewat
+    # code page OEM modulo 256, jadi kode >= 256 (€, ł, Cyrillic, CJK) menjadi karakter lain
+    code = ord(char)
+    if code >= 256:
+        return False
+    _hold_sequence(payload, MODIFIERS['ALT'], [_KEYPAD_DIGITS[int(digit)] for digit in f"0{code}"])
+    return True
+
+def _unicode_macos(payload, char, layout):
+    # Input source "Unicode Hex Input": Option + 4 digit hex per unit UTF-16 (layout-nya sendiri, seperti US)
+    data = char.encode('utf-16-be')
+    for i in range(0, len(data), 2):
+        unit = f"{int.from_bytes(data[i:i + 2], 'big'):04x}"
+        _hold_sequence(payload, MODIFIERS['ALT'], [_US_HEX_DIGITS[digit] for digit in unit])
+    return True
+
+UNICODE_INPUT = {
+    'linux': _unicode_linux,
+    'windows': _unicode_windows,
+    'macos': _unicode_macos,
+}
+_UNICODE_BLOCKS = {}
+
+def _unicode_block(char, layout):
+    # Urutan input Unicode dihitung sekali per (OS, layout, karakter); None jika OS tidak punya metode input
+    key = (target_os(), layout, char)
+    if key not in _UNICODE_BLOCKS:
+        encoder = UNICODE_INPUT.get(key[0])
+        if encoder is None or not char.isprintable():
+            _UNICODE_BLOCKS[key] = None
+        else:
+            block = CompiledPayload()
+            _UNICODE_BLOCKS[key] = block if encoder(block, char, layout) else None
+    return _UNICODE_BLOCKS[key]
+
+def set_keystroke_planning(enabled):
+    ENCODER_OPTIONS['plan_keystrokes'] = bool(enabled)
+
+def set_report_mode(mode):
+    if mode not in REPORT_MODES:
+        raise ValueError(f"Unknown report mode: {mode}")
+    ENCODER_OPTIONS['report_mode'] = mode
+
+def report_slot():
+    # Panjang report terbesar yang bisa dihasilkan encoder, untuk slot record di file cache
+    return NKRO_REPORT_LENGTH if ENCODER_OPTIONS['report_mode'] == 'nkro' else MAX_REPORT_LENGTH
+
+def encoder_fingerprint():
+    # Semua yang menentukan report hasil kompilasi selain layout dan isi payload
+    plan = 'plan' if ENCODER_OPTIONS['plan_keystrokes'] else 'tap'
+    return f"{ENCODER_VERSION}:{macro_fingerprint()}:{plan}:{ENCODER_OPTIONS['report_mode']}"
+
+_SHIFT = MODIFIERS['SHIFT']
+_CAPSLOCK = KEYCODES['CAPSLOCK']
+
+def _plan_strokes(strokes, caps_allowed):
+    # Program dinamis atas state (Caps Lock aktif, modifier yang sedang ditahan).
+    # strokes berisi (modifier, keycode, jenis) dengan jenis 'upper' (huruf besar ASCII), 'neutral'
+    # (tidak terpengaruh Caps Lock) atau None; hasilnya daftar (report, delay)
+    # dengan biaya delay + PLAN_REPORT_COST per report paling kecil. Awal dan akhir selalu
+    # Caps Lock mati dan semua tombol dilepas, sehingga blok bisa disambung di mana saja
+    toggle = [(encode_report(0, _CAPSLOCK), COMBINATION_DELAY), (RELEASE_REPORT, COMBINATION_DELAY)]
+    states = {(False, 0): (0.0, None)}
+    history = []
+    for modifiers, keycode, kind in strokes:
+        upper = kind == 'upper'
+        options = {}
+        for (caps, held), (cost, _) in states.items():
+            for caps_after in ((caps, not caps) if caps_allowed and upper else (caps,)):
+                if caps_after and kind is None:
+                    continue
+                actions = list(toggle) if caps_after != caps else []
+                held_before = 0 if actions else held
+                # Caps Lock menggantikan Shift hanya untuk huruf
+                effective = modifiers & ~_SHIFT if caps_after and upper else modifiers
+                if effective == 0:
+                    # Report tanpa modifier sekaligus melepas modifier yang masih ditahan
+                    choices = [(0, [(encode_report(0, keycode), KEYPRESS_DELAY), (RELEASE_REPORT, KEYPRESS_DELAY * 2)])]
+                elif effective == held_before:
+                    choices = [(held_before, [(encode_report(held_before, keycode), KEYPRESS_DELAY),
+                                              (encode_report(held_before), KEYPRESS_DELAY * 2)])]
+                else:
+                    choices = [
+                        (0, [(encode_report(effective, keycode), COMBINATION_DELAY), (RELEASE_REPORT, COMBINATION_DELAY)]),
+                        (effective, [(encode_report(effective), COMBINATION_DELAY),
+                                     (encode_report(effective, keycode), KEYPRESS_DELAY),
+                                     (encode_report(effective), KEYPRESS_DELAY * 2)]),
+                    ]
+                for held_after, reports in choices:
+                    step = actions + reports
+                    total = cost + sum(delay for _, delay in step) + PLAN_REPORT_COST * len(step)
+                    state = (caps_after, held_after)
+                    if state not in options or total < options[state][0]:
+                        options[state] = (total, ((caps, held), step))
+        history.append(options)
+        states = options
+
+    def finish(state):
+        caps, held = state
+        if caps:
+            return toggle
+        return [(RELEASE_REPORT, COMBINATION_DELAY)] if held else []
+
+    def final_cost(state):
+        return states[state][0] + sum(delay + PLAN_REPORT_COST for _, delay in finish(state))
+
+    state = min(states, key=final_cost)
+    plan = list(finish(state))
+    for options in reversed(history):
+        state, step = options[state][1]
+        plan[:0] = step
+    return plan
+
+def _plan_string(payload, text, layout):
+    char_table = LAYOUTS[layout]
+    # Caps Lock di macOS punya jeda aktivasi, jadi hanya modifier yang direncanakan
+    caps_allowed = target_os() != 'macos'
+    strokes = []
+
+    def flush():
+        for report, delay in _plan_strokes(strokes, caps_allowed):
+            payload.append(report, delay)
+        strokes.clear()
+
+    for char in text:
+        entry = char_table.get(char)
+        if entry is None:
+            flush()
+            block = _unicode_block(char, layout)
+            if block is None:
+                _issue(payload, f"Unsupported character '{char}' in Duckyscript")
+            else:
+                payload.extend(block)
+            continue
+        if len(entry) > 1 or not char.isascii() or 'a' <= char <= 'z':
+            kind = None
+        elif 'A' <= char <= 'Z':
+            kind = 'upper'
+        else:
+            kind = 'neutral' if layout in CAPS_LETTERS_ONLY_LAYOUTS or char == ' ' else None
+        strokes.extend((modifiers, keycode, kind) for modifiers, keycode in entry)
+    flush()
+
+def pack_nkro_strokes(strokes):
+    # Stroke berurutan dengan modifier yang sama dan keycode yang terus naik digabung menjadi satu
+    # report bitmap: host memproses bitmap mulai dari usage terkecil, jadi urutan ketikan tetap sama
+    runs = []
+    for modifiers, keycode in strokes:
+        if runs and runs[-1][0] == modifiers and keycode > runs[-1][1][-1]:
+            runs[-1][1].append(keycode)
+        else:
+            runs.append((modifiers, [keycode]))
+    return runs
+
+def _compile_string_nkro(payload, text, layout):
+    char_table = LAYOUTS[layout]
+    strokes = []
+
+    def flush():
+        # Timing sama dengan _press, tetapi satu pasangan press/release untuk setiap run
+        for modifiers, keycodes in pack_nkro_strokes(strokes):
+            if modifiers:
+                payload.append(encode_nkro_report(modifiers, *keycodes), COMBINATION_DELAY)
+                payload.append(NKRO_RELEASE_REPORT, COMBINATION_DELAY)
+            else:
+                payload.append(encode_nkro_report(0, *keycodes), KEYPRESS_DELAY)
+                payload.append(NKRO_RELEASE_REPORT, KEYPRESS_DELAY * 2)
+        strokes.clear()
+
+    for char in text:
+        entry = char_table.get(char)
+        if entry is None:
+            flush()
+            block = _unicode_block(char, layout)
+            if block is None:
+                _issue(payload, f"Unsupported character '{char}' in Duckyscript")
+            else:
+                payload.extend(block)
+            continue
+        strokes.extend(entry)
+    flush()
+
+def _compile_string(payload, text, layout):
+    if ENCODER_OPTIONS['report_mode'] == 'nkro':
+        _compile_string_nkro(payload, text, layout)
+        return
+    if ENCODER_OPTIONS['plan_keystrokes']:
+        _plan_string(payload, text, layout)
+        return
+    if np is not None and len(text) >= BATCH_MIN_LENGTH and _compile_string_batch(payload, text, layout):
+        return
+    char_table = LAYOUTS[layout]
+    for char in text:
+        strokes = char_table.get(char)
+        if strokes is None:
+            block = _unicode_block(char, layout)
+            if block is None:
+                _issue(payload, f"Unsupported character '{char}' in Duckyscript")
+            else:
+                payload.extend(block)
+            continue
+        for modifiers, keycode in strokes:
+            _press(payload, modifiers, keycode)
+
+def compile_string(payload, text, layout='us'):
+    # Teks diketik apa adanya (tanpa strip/parsing perintah), dipakai untuk slot template
+    _compile_string(payload, text, layout)
+
+def _build_key_table():
+    # Nama karakter ber-Shift tidak menjadi perintah: EXCLAMATION_MARK akan mengetik "1"
+    table = {name: keycode for name, keycode in KEYCODES.items() if name not in SHIFTED_KEY_NAMES}
+    # Alias nama tombol yang umum dipakai di DuckyScript
+    aliases = {
+        'ESC': 'ESCAPE', 'DEL': 'DELETE', 'BREAK': 'PAUSE', 'PRINTSCRN': 'PRINTSCREEN',
+        'MENU': 'KEYPADCOMPOSE', 'APP': 'KEYPADCOMPOSE',
+        'UPARROW': 'UP', 'DOWNARROW': 'DOWN', 'LEFTARROW': 'LEFT', 'RIGHTARROW': 'RIGHT',
+        'PAGE_UP': 'PAGEUP', 'PAGE_DOWN': 'PAGEDOWN',
+    }
+    for alias, name in aliases.items():
+        table[alias] = table[name]
+    return table
+
+KEY_TABLE = _build_key_table()
+MODIFIER_TABLE = dict(MODIFIERS)
+MODIFIER_TABLE['CONTROL'] = MODIFIER_TABLE['CTRL']
+MODIFIER_TABLE['OPTION'] = MODIFIER_TABLE['ALT']
+
+def _lookup_key(name):
+    keycode = KEY_TABLE.get(name)
+    if keycode is None:
+        keycode = KEY_TABLE.get(name.upper())
+    return keycode
+
+def _cmd_rem(payload, command, argument, layout):
+    pass
+
+def _cmd_string(payload, command, argument, layout):
+    _compile_string(payload, argument, layout)
+
+def _cmd_stringln(payload, command, argument, layout):
+    _compile_string(payload, argument, layout)
+    _press(payload, 0, KEYCODES['ENTER'])
+
+def _cmd_delay(payload, command, argument, layout):
+    if not argument:
+        _issue(payload, f"DELAY command requires a time parameter in line: {command}")
+        return
+    try:
+        payload.add_delay(int(argument.split()[0]) / 1000)
+    except ValueError:
+        _issue(payload, f"Invalid DELAY format in line: {command} {argument}")
+
+def _stringfile_path(argument):
+    return os.path.expanduser(argument.strip())
+
+def iter_stringfile(path, layout='us', offset=0):
+    # Isi file diketik per potongan; setiap blok disertai byte offset awalnya di file sehingga
+    # pengiriman bisa dilanjutkan dari tengah file. offset harus berasal dari blok sebelumnya
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        while True:
+            # Batas chunk selalu di kelipatan STRINGFILE_CHUNK_SIZE supaya blok hasil resume sama persis
+            data = file.read(STRINGFILE_CHUNK_SIZE - file.tell() % STRINGFILE_CHUNK_SIZE)
+            # CR dari file Windows dibuang, baris baru cukup diketik sebagai ENTER
+            text = decoder.decode(data, final=not data).replace('\r', '')
+            if text:
+                block = CompiledPayload()
+                _compile_string(block, text, layout)
+                yield offset, block
+            if not data:
+                return
+            # Byte karakter UTF-8 yang terpotong di akhir chunk ikut chunk berikutnya
+            offset = file.tell() - len(decoder.getstate()[0])
+
+def _cmd_stringfile(payload, command, argument, layout):
+    # Kompilasi penuh (untuk cache/VM); pengiriman --stream memakai iter_line_blocks
+    path = _stringfile_path(argument)
+    if not os.path.isfile(path):
+        _issue(payload, f"STRINGFILE not found: {argument}")
+        return
+    for _, block in iter_stringfile(path, layout):
+        payload.extend(block)
+
+def _parse_keys(payload, tokens, line):
+    # Modifier di depan lalu tombol, misalnya ["CTRL", "ALT", "DELETE"]; None jika tidak valid
+    modifiers = 0
+    keycodes = []
+    for token in tokens:
+        modifier = MODIFIER_TABLE.get(token.upper())
+        if modifier is not None and not keycodes:
+            modifiers |= modifier
+            continue
+        keycode = _lookup_key(token)
+        if keycode is None:
+            _issue(payload, f"Unsupported combination: {line}")
+            return None
+        keycodes.append(keycode)
+    if len(keycodes) > KEYCODE_SLOTS:
+        _issue(payload, f"Too many keys in combination: {line}")
+        return None
+    return modifiers, keycodes
+
+def _cmd_keys(payload, command, argument, layout):
+    # Satu tombol ("ENTER", "F5") atau kombinasi ("CTRL ALT DELETE", "GUI r")
+    line = f"{command} {argument}"
+    keys = _parse_keys(payload, [command] + argument.split(), line)
+    if keys is None:
+        return
+    modifiers, keycodes = keys
+    if not any(keycode in CONSUMER_USAGES for keycode in keycodes):
+        _press(payload, modifiers, *keycodes)
+    elif modifiers or len(keycodes) > 1:
+        _issue(payload, f"Media keys cannot be combined with other keys: {line}")
+    else:
+        # Tombol media: satu pasangan press/release pada report consumer control
+        payload.append(encode_consumer_report(CONSUMER_USAGES[keycodes[0]]), KEYPRESS_DELAY)
+        payload.append(CONSUMER_RELEASE_REPORT, KEYPRESS_DELAY * 2)
+
+def _cmd_hold(payload, command, argument, layout):
+    # Kombinasi tetap ditekan sampai RELEASE atau tombol berikutnya
+    line = f"{command} {argument}"
+    keys = _parse_keys(payload, argument.split(), line)
+    if keys is None:
+        return
+    if any(keycode in CONSUMER_USAGES for keycode in keys[1]):
+        _issue(payload, f"Media keys cannot be held: {line}")
+        return
+    payload.append(encode_report(keys[0], *keys[1]))
+
+def _cmd_release(payload, command, argument, layout):
+    # Semua tombol dilepas sekaligus
+    payload.append(RELEASE_REPORT)
+
+_MACRO_BLOCKS = {}
+_expanding = set()
+
+def _cmd_macro(payload, command, argument, layout):
+    # Macro dikompilasi sekali per (OS, nama, layout, opsi encoder) lalu bloknya disambung
+    key = (target_os(), command, layout) + tuple(ENCODER_OPTIONS.values())
+    block = _MACRO_BLOCKS.get(key)
+    if block is None:
+        lines = macro_lines(command)
+        if lines is None:
+            _issue(payload, f"Macro {command} is not defined for {target_os()}")
+            return
+        if key in _expanding:
+            _issue(payload, f"Macro {command} expands to itself")
+            return
+        _expanding.add(key)
+        try:
+            block = CompiledPayload()
+            for line in lines:
+                compile_line(block, line, layout)
+        finally:
+            _expanding.discard(key)
+        _MACRO_BLOCKS[key] = block
+    payload.extend(block)
+
+COMMANDS = {
+    'REM': _cmd_rem,
+    'STRING': _cmd_string,
+    'STRINGLN': _cmd_stringln,
+    'STRINGFILE': _cmd_stringfile,
+    'DELAY': _cmd_delay,
+    'HOLD': _cmd_hold,
+    'RELEASE': _cmd_release,
+}
+for _name in list(KEY_TABLE) + list(MODIFIER_TABLE):
+    COMMANDS.setdefault(_name, _cmd_keys)
+# Nama macro tidak boleh menimpa perintah atau tombol bawaan
+for _name in macro_names():
+    COMMANDS.setdefault(_name, _cmd_macro)
+
+def compile_line(payload, line, layout='us'):
+    # Baris di-tokenize sekali lalu langsung diarahkan ke handler lewat dict
+    line = line.strip()
+    if not line:
+        return
+    command, _, argument = line.partition(" ")
+    handler = COMMANDS.get(command)
+    if handler is None:
+        _issue(payload, f"Unknown command: {command}")
+        return
+    handler(payload, command, argument, layout)
+
+class LineCache:
+    # Hasil kompilasi per baris, dikunci dengan hash isi baris. Baris yang tidak berubah
+    # tidak dikompilasi ulang, bloknya langsung disambung ke program
+    def __init__(self, layout='us'):
+        self.layout = layout
+        self.blocks = {}
+        # (leading_delay, record biner) per baris, diisi oleh payload_cache saat menulis file cache
+        self.packed = {}
+        self.used = set()
+        self.misses = 0
+        # Nama file program utuh (.bin/.vm/.tpl) terakhir untuk payload ini, dihapus saat diganti
+        self.program = None
+
+    def __getstate__(self):
+        # Blok yang sudah punya versi biner tidak perlu ikut disimpan
+        state = dict(self.__dict__)
+        state['blocks'] = {key: block for key, block in self.blocks.items() if key not in self.packed}
+        return state
+
+    @staticmethod
+    def key(line):
+        return hashlib.blake2b(line.strip().encode(), digest_size=16).digest()
+
+    def block(self, key, line):
+        self.used.add(key)
+        block = self.blocks.get(key)
+        if block is None:
+            block = CompiledPayload()
+            compile_line(block, line, self.layout)
+            self.blocks[key] = block
+            self.misses += 1
+        return block
+
+    def compile_line(self, payload, line):
+        payload.extend(self.block(self.key(line), line))
+
+    def prune(self):
+        # Buang blok milik baris yang sudah tidak ada di payload
+        self.blocks = {key: self.blocks[key] for key in self.used if key in self.blocks}
+        self.packed = {key: self.packed[key] for key in self.used if key in self.packed}
+        self.used = set()
+        self.misses = 0
+
+def line_compiler(layout, line_cache):
+    if line_cache is None:
+        return lambda payload, line: compile_line(payload, line, layout)
+    return line_cache.compile_line
+
+def start_block():
+    # Report kosong untuk memastikan awal yang bersih
+    payload = CompiledPayload()
+    payload.append(RELEASE_REPORT, START_DELAY)
+    return payload
+
+def iter_line_blocks(line, layout='us', file_offset=0):
+    # Satu blok per baris, kecuali STRINGFILE yang menghasilkan satu blok per potongan file.
+    # Menghasilkan pasangan (offset di file STRINGFILE, blok)
+    command, _, argument = line.strip().partition(" ")
+    if command == 'STRINGFILE' and os.path.isfile(_stringfile_path(argument)):
+        yield from iter_stringfile(_stringfile_path(argument), layout, file_offset)
+        return
+    block = CompiledPayload()
+    compile_line(block, line, layout)
+    yield 0, block
+
+def iter_compiled(lines, layout='us', file_offset=0):
+    # lines berisi pasangan (offset, line); menghasilkan (offset baris, offset di STRINGFILE, blok).
+    # file_offset hanya berlaku untuk baris pertama (resume di tengah STRINGFILE)
+    for offset, line in lines:
+        for chunk_offset, block in iter_line_blocks(line, layout, file_offset):
+            if block or block.leading_delay:
+                yield offset, chunk_offset, block.materialize()
+        file_offset = 0
+
+def iter_reports(duckyscript, layout='us'):
+    # Menghasilkan (report, delay) dengan memori terbatas pada STREAM_WINDOW report
+    window = start_block()
+    for line in duckyscript:
+        compile_line(window, line, layout)
+        if len(window) > STREAM_WINDOW:
+            # Report terakhir ditahan supaya DELAY berikutnya masih bisa ditambahkan
+            yield from zip(window.reports[:-1], window.delays[:-1])
+            del window.reports[:-1]
+            del window.delays[:-1]
+    yield from zip(window.reports, window.delays)
+
+def _is_keypress(report):
+    return len(report) == MAX_REPORT_LENGTH and report[1] == KEYBOARD_REPORT_ID and any(report[KEYS])
+
+def _is_key_release(press, report):
+    # Report tanpa tombol yang melepas semua modifier atau tetap menahan modifier tombol sebelumnya
+    return (len(report) == MAX_REPORT_LENGTH and report[1] == KEYBOARD_REPORT_ID
+            and not any(report[KEYS]) and report[MODIFIER_OFFSET] in (0, press[MODIFIER_OFFSET]))
+
+def _can_elide(press, release, following):
+    # Release boleh dibuang jika report berikutnya menekan tombol lain dengan modifier yang sama:
+    # report itu sendiri sudah melepas tombol sebelumnya
+    report, following_report = press[1], following[1]
+    return (_is_keypress(following_report)
+            and report[MODIFIER_OFFSET] == following_report[MODIFIER_OFFSET]
+            and not set(report[KEYS]).intersection(following_report[KEYS]) - {0}
+            and press[2] + release[2] <= ELIDE_MAX_HOLD)
+
+def elide_releases(entries):
+    # entries berisi (index, report, delay); release di antara dua tombol yang berbeda dibuang dan
+    # delay-nya digabung ke report tombol sebelumnya. Indeks asli tetap dipakai untuk resume
+    pending = []
+    for entry in entries:
+        if len(pending) == 2:
+            press, release = pending
+            if _can_elide(press, release, entry):
+                yield press[0], press[1], press[2] + release[2]
+            else:
+                yield press
+                yield release
+            pending = [entry]
+        elif pending and _is_keypress(pending[0][1]) and _is_key_release(pending[0][1], entry[1]):
+            pending.append(entry)
+        else:
+            yield from pending
+            pending = [entry]
+    yield from pending
+
+def uses_stringfile(duckyscript):
+    return any(line.strip().partition(" ")[0] == 'STRINGFILE' for line in duckyscript)
+
+def compile_duckyscript(duckyscript, layout='us'):
+    payload = start_block()
+    for line in duckyscript:
+        compile_line(payload, line, layout)
+    log.debug(f"Compiled {len(payload)} reports, estimated {payload.total_duration():.2f}s")
+    return payload
@@ -0,0 +1,316 @@
+import logging as log
+import re
+
+from utils.duckyscript_compiler import CompiledPayload, line_compiler, start_block
+
+# Opcode bytecode DuckyScript 3
+OP_EMIT = 0         # (OP_EMIT, block)             kirim satu blok report
+OP_REPEAT = 1       # (OP_REPEAT, block, count)    kirim blok yang sama sebanyak count kali
+OP_SET = 2          # (OP_SET, name, expr)
+OP_JUMP = 3         # (OP_JUMP, target)
+OP_JUMP_IF_FALSE = 4  # (OP_JUMP_IF_FALSE, expr, target)
+OP_CALL = 5         # (OP_CALL, target)
+OP_RETURN = 6       # (OP_RETURN,)
+OP_HALT = 7         # (OP_HALT,)
+
+# Batas op berturut-turut tanpa report: loop yang tidak pernah mengirim apa pun (WHILE TRUE kosong,
+# atau isinya hanya VAR) dihentikan dengan error, bukan berputar selamanya di --dry-run atau event loop
+IDLE_STEP_LIMIT = 1000000
+
+CONTROL_COMMANDS = {
+    'VAR', 'IF', 'ELSE', 'END_IF', 'WHILE', 'END_WHILE',
+    'FUNCTION', 'END_FUNCTION', 'RETURN', 'REPEAT',
+}
+
+_TOKEN = re.compile(r"\s*(?:(\d+)|\$(\w+)|(TRUE|FALSE)\b|(&&|\|\||==|!=|<=|>=|<<|>>|[-+*/%()<>!&|^]))")
+_OPERATORS = {'&&': ' and ', '||': ' or ', '!': ' not ', '/': '//'}
+_ASSIGNMENT = re.compile(r"^\$(\w+)\s*=\s*(.+)$")
+_CALL = re.compile(r"^(\w+)\(\)$")
+
+
+class DuckyScriptError(Exception):
+    def __init__(self, message, line_number=None):
+        if line_number is not None:
+            message = f"line {line_number}: {message}"
+        super().__init__(message)
+        self.line_number = line_number
+
+
+def compile_expression(expression, declared, line_number=None):
+    # Ekspresi DuckyScript diterjemahkan ke ekspresi Python yang hanya berisi angka, variabel dan operator
+    parts = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match or match.end() == position:
+            raise DuckyScriptError(f"Invalid expression '{expression}'", line_number)
+        number, name, boolean, operator = match.groups()
+        if number is not None:
+            parts.append(number)
+        elif name is not None:
+            if name not in declared:
+                raise DuckyScriptError(f"Undeclared variable ${name}", line_number)
+            parts.append(f"_v[{name!r}]")
+        elif boolean is not None:
+            parts.append('1' if boolean == 'TRUE' else '0')
+        else:
+            parts.append(_OPERATORS.get(operator, operator))
+        position = match.end()
+    if not parts:
+        raise DuckyScriptError("Empty expression", line_number)
+    try:
+        return Expression("".join(parts), line_number)
+    except SyntaxError:
+        raise DuckyScriptError(f"Invalid expression '{expression}'", line_number)
+
+
+class Expression:
+    # Disimpan sebagai source supaya program bisa di-pickle ke cache. line_number dipakai untuk error
+    # yang baru muncul saat dijalankan (pembagian dengan nol)
+    def __init__(self, source, line_number=None):
+        self.source = source
+        self.line_number = line_number
+        self.code = compile(source, '<duckyscript>', 'eval')
+
+    def __reduce__(self):
+        return (Expression, (self.source, self.line_number))
+
+    def evaluate(self, variables):
+        try:
+            return int(eval(self.code, {'__builtins__': {}}, {'_v': variables}))
+        except ArithmeticError as e:
+            raise DuckyScriptError(f"Arithmetic error: {e}", self.line_number) from e
+
+
+class VMProgram:
+    # Program DuckyScript 3: ops dijalankan oleh VM, blocks berisi report yang sudah jadi
+    def __init__(self, ops, blocks):
+        self.ops = ops
+        self.blocks = blocks
+
+    def iter_from(self, index=0):
+        # VM deterministik, jadi resume cukup dengan menjalankan ulang tanpa mengirim
+        # sampai jumlah report mencapai index; blok yang sudah terkirim dilewati utuh
+        ops = self.ops
+        blocks = self.blocks
+        variables = {}
+        stack = []
+        sent = 0
+        pc = 0
+        # Jumlah op sejak blok report terakhir (termasuk blok yang dilewati saat resume)
+        idle = 0
+        while True:
+            op = ops[pc]
+            code = op[0]
+            idle += 1
+            if idle > IDLE_STEP_LIMIT:
+                raise DuckyScriptError("loop emits no reports")
+            if code == OP_EMIT:
+                block = blocks[op[1]]
+                size = len(block)
+                if sent + size > index:
+                    for i, report, delay in block.iter_from(max(index - sent, 0)):
+                        yield sent + i, report, delay
+                sent += size
+                idle = 0
+                pc += 1
+            elif code == OP_REPEAT:
+                block = blocks[op[1]]
+                size = len(block)
+                count = op[2]
+                skipped = min(max(index - sent, 0) // size, count) if size else count
+                sent += skipped * size
+                for _ in range(count - skipped):
+                    for i, report, delay in block.iter_from(max(index - sent, 0)):
+                        yield sent + i, report, delay
+                    sent += size
+                if size and count:
+                    idle = 0
+                pc += 1
+            elif code == OP_SET:
+                variables[op[1]] = op[2].evaluate(variables)
+                pc += 1
+            elif code == OP_JUMP:
+                pc = op[1]
+            elif code == OP_JUMP_IF_FALSE:
+                pc = pc + 1 if op[1].evaluate(variables) else op[2]
+            elif code == OP_CALL:
+                stack.append(pc + 1)
+                pc = op[1]
+            elif code == OP_RETURN:
+                if not stack:
+                    return
+                pc = stack.pop()
+            elif code == OP_HALT:
+                return
+
+
+class _Builder:
+    def __init__(self, layout, line_cache=None):
+        self.compile_line = line_compiler(layout, line_cache)
+        self.ops = []
+        self.blocks = []
+        self.current = None
+        self.declared = set()
+        self.functions = {}
+        self.calls = []
+        self.stack = []
+        self.last_line = None
+
+    def emit(self, op):
+        self.flush()
+        self.ops.append(op)
+        return len(self.ops) - 1
+
+    def flush(self):
+        if self.current is not None:
+            self.current.materialize()
+        if self.current:
+            self.ops.append((OP_EMIT, len(self.blocks)))
+            self.blocks.append(self.current)
+        self.current = None
+
+    def add_line(self, line):
+        if self.current is None:
+            self.current = CompiledPayload()
+        self.compile_line(self.current, line)
+
+    def add_block(self, block):
+        self.flush()
+        self.current = block
+
+    def patch(self, index, target):
+        op = self.ops[index]
+        self.ops[index] = op[:-1] + (target,)
+
+    def pop(self, kind, line_number):
+        if not self.stack or self.stack[-1][0] != kind:
+            raise DuckyScriptError(f"END_{kind} without matching {kind}", line_number)
+        return self.stack.pop()
+
+
+def _condition(argument):
+    argument = argument.strip()
+    if argument.endswith("THEN"):
+        argument = argument[:-4]
+    return argument
+
+def _compile_control(builder, command, argument, line_number):
+    declared = builder.declared
+    if command == 'VAR':
+        match = _ASSIGNMENT.match(argument.strip())
+        if not match:
+            raise DuckyScriptError(f"Invalid VAR declaration '{argument}'", line_number)
+        name, expression = match.groups()
+        code = compile_expression(expression, declared, line_number)
+        declared.add(name)
+        builder.emit((OP_SET, name, code))
+    elif command == 'WHILE':
+        # Baris sebelum WHILE (termasuk blok yang hanya berisi DELAY) ditutup dulu, supaya lompatan balik
+        # tidak mengulang blok itu di setiap iterasi
+        builder.flush()
+        start = len(builder.ops)
+        jump = builder.emit((OP_JUMP_IF_FALSE, compile_expression(_condition(argument), declared, line_number), None))
+        builder.stack.append(('WHILE', start, jump))
+    elif command == 'END_WHILE':
+        _, start, jump = builder.pop('WHILE', line_number)
+        builder.emit((OP_JUMP, start))
+        builder.patch(jump, len(builder.ops))
+    elif command == 'IF':
+        jump = builder.emit((OP_JUMP_IF_FALSE, compile_expression(_condition(argument), declared, line_number), None))
+        builder.stack.append(('IF', jump, []))
+    elif command == 'ELSE':
+        if not builder.stack or builder.stack[-1][0] != 'IF':
+            raise DuckyScriptError("ELSE without matching IF", line_number)
+        _, jump, exits = builder.stack[-1]
+        if jump is None:
+            raise DuckyScriptError("ELSE after ELSE", line_number)
+        exits.append(builder.emit((OP_JUMP, None)))
+        builder.patch(jump, len(builder.ops))
+        nested, _, condition = argument.partition(" ")
+        if nested == 'IF':
+            jump = builder.emit((OP_JUMP_IF_FALSE, compile_expression(_condition(condition), declared, line_number), None))
+        else:
+            jump = None
+        builder.stack[-1] = ('IF', jump, exits)
+    elif command == 'END_IF':
+        _, jump, exits = builder.pop('IF', line_number)
+        builder.flush()
+        target = len(builder.ops)
+        if jump is not None:
+            builder.patch(jump, target)
+        for index in exits:
+            builder.patch(index, target)
+    elif command == 'FUNCTION':
+        match = _CALL.match(argument.strip())
+        if not match:
+            raise DuckyScriptError(f"Invalid FUNCTION declaration '{argument}'", line_number)
+        skip = builder.emit((OP_JUMP, None))
+        builder.functions[match.group(1)] = len(builder.ops)
+        builder.stack.append(('FUNCTION', skip))
+    elif command == 'END_FUNCTION':
+        _, skip = builder.pop('FUNCTION', line_number)
+        builder.emit((OP_RETURN,))
+        builder.patch(skip, len(builder.ops))
+    elif command == 'RETURN':
+        builder.emit((OP_RETURN,))
+    elif command == 'REPEAT':
+        try:
+            count = int(argument.split()[0])
+        except (ValueError, IndexError):
+            raise DuckyScriptError(f"Invalid REPEAT count '{argument}'", line_number)
+        if builder.last_line is None:
+            log.warning(f"line {line_number}: REPEAT without a previous command")
+            return
+        block = CompiledPayload()
+        builder.compile_line(block, builder.last_line)
+        builder.flush()
+        builder.blocks.append(block.materialize())
+        builder.ops.append((OP_REPEAT, len(builder.blocks) - 1, count))
+
+def compile_program(duckyscript, layout='us', line_cache=None):
+    builder = _Builder(layout, line_cache)
+    builder.add_block(start_block())
+    for line_number, line in enumerate(duckyscript, start=1):
+        line = line.strip()
+        if not line or line.startswith("REM"):
+            continue
+        command, _, argument = line.partition(" ")
+        if command in CONTROL_COMMANDS:
+            _compile_control(builder, command, argument, line_number)
+            if command != 'REPEAT':
+                builder.last_line = None
+            continue
+        assignment = _ASSIGNMENT.match(line)
+        if assignment:
+            name, expression = assignment.groups()
+            if name not in builder.declared:
+                raise DuckyScriptError(f"Undeclared variable ${name}", line_number)
+            builder.emit((OP_SET, name, compile_expression(expression, builder.declared, line_number)))
+            builder.last_line = None
+            continue
+        call = _CALL.match(line)
+        if call:
+            builder.calls.append((builder.emit((OP_CALL, None)), call.group(1), line_number))
+            builder.last_line = None
+            continue
+        builder.add_line(line)
+        builder.last_line = line
+
+    if builder.stack:
+        raise DuckyScriptError(f"Unterminated {builder.stack[-1][0]} block")
+    builder.emit((OP_HALT,))
+    for index, name, line_number in builder.calls:
+        if name not in builder.functions:
+            raise DuckyScriptError(f"Unknown function {name}()", line_number)
+        builder.patch(index, builder.functions[name])
+    return VMProgram(builder.ops, builder.blocks)
+
+def is_control_line(line):
+    line = line.strip()
+    command = line.partition(" ")[0]
+    return bool(command in CONTROL_COMMANDS or _ASSIGNMENT.match(line) or _CALL.match(line))
+
+def uses_control_flow(duckyscript):
+    return any(is_control_line(line) for line in duckyscript)
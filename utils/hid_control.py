@@ -0,0 +1,155 @@
+import asyncio
+import logging as log
+
+from utils.hid_descriptor import BOOT_DESCRIPTOR, HID_DESCRIPTORS, HIDP_HEADERS, report_layout
+
+# Jenis transaksi HIDP (nibble atas byte header) dan hasil HANDSHAKE (nibble bawah)
+HANDSHAKE = 0x0
+HID_CONTROL = 0x1
+GET_REPORT = 0x4
+SET_REPORT = 0x5
+GET_PROTOCOL = 0x6
+SET_PROTOCOL = 0x7
+GET_IDLE = 0x8
+SET_IDLE = 0x9
+DATA = 0xa
+
+SUCCESSFUL = 0x0
+ERR_INVALID_REPORT_ID = 0x2
+ERR_UNSUPPORTED_REQUEST = 0x3
+ERR_INVALID_PARAMETER = 0x4
+
+# Parameter HID_CONTROL
+CONTROL_SUSPEND = 0x3
+CONTROL_EXIT_SUSPEND = 0x4
+CONTROL_VIRTUAL_CABLE_UNPLUG = 0x5
+
+PROTOCOL_BOOT = 0
+PROTOCOL_REPORT = 1
+# Nomor jenis report pada parameter GET_REPORT / SET_REPORT / DATA
+REPORT_TYPES = {1: 'input', 2: 'output', 3: 'feature'}
+
+# Batas tunggu host selesai menyiapkan keyboard (sama dengan jeda tetap sebelumnya)
+HOST_SETTLE_TIMEOUT = 3
+
+
+BOOT_LAYOUT = report_layout(BOOT_DESCRIPTOR)
+
+
+class HIDState:
+    # Status yang diatur host lewat kanal control/interrupt, dibaca oleh pengirim report
+    def __init__(self, keyboard_report_id, led_offset):
+        self.report_keyboard = (keyboard_report_id, led_offset)
+        self.leds = None
+        self.protocol = PROTOCOL_REPORT
+        self.idle_rate = 0
+        self.suspended = False
+        self.unplugged = False
+        # Diset saat host mengirim status LED pertama: tanda keyboard sudah dikonfigurasi host.
+        # Dibuat di dalam event loop yang menjalankan koneksi
+        self.configured = asyncio.Event()
+
+    def set_leds(self, leds):
+        self.leds = leds
+        self.configured.set()
+
+    @property
+    def keyboard(self):
+        # (report ID, posisi byte LED di frame) report output keyboard pada protocol yang sedang dipakai
+        if self.protocol == PROTOCOL_BOOT:
+            return BOOT_LAYOUT.keyboard_id, BOOT_LAYOUT.led_offset
+        return self.report_keyboard
+
+    def set_output_report(self, report_id, data):
+        # data tanpa header dan report ID, sedangkan led_offset dihitung dari awal frame
+        keyboard_report_id, led_offset = self.keyboard
+        if report_id == keyboard_report_id and len(data) > led_offset - 2:
+            self.set_leds(data[led_offset - 2])
+
+    async def wait_configured(self, timeout=HOST_SETTLE_TIMEOUT):
+        try:
+            await asyncio.wait_for(self.configured.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class HIDTransactions:
+    # Jawaban transaksi kanal control (PSM 17) dihitung langsung dari HIDState; report output (LED)
+    # dari kanal interrupt (PSM 19) dicatat. Pembacaan dan pengiriman socket dilakukan pemanggil
+    def __init__(self, state, report_mode='boot'):
+        self.state = state
+        self.report_formats = report_layout(HID_DESCRIPTORS[report_mode]).formats
+
+    @property
+    def formats(self):
+        # Boot protocol memakai format boot keyboard, bukan report descriptor yang didaftarkan
+        if self.state.protocol == PROTOCOL_BOOT:
+            return BOOT_LAYOUT.formats
+        return self.report_formats
+
+    def interrupt(self, message):
+        if message[0] != HIDP_HEADERS['output'] or len(message) < 2:
+            return
+        self.state.set_output_report(message[1], message[2:])
+
+    def control(self, message):
+        # Balasan untuk host, atau None jika transaksi tidak dijawab
+        transaction, parameter = message[0] >> 4, message[0] & 0x0f
+        log.debug(f"[RX-17] HID transaction {transaction:#x} parameter {parameter:#x}: {message.hex()}")
+        if transaction == HID_CONTROL:
+            # HID_CONTROL tidak dijawab
+            if parameter == CONTROL_SUSPEND:
+                self.state.suspended = True
+            elif parameter == CONTROL_EXIT_SUSPEND:
+                self.state.suspended = False
+            elif parameter == CONTROL_VIRTUAL_CABLE_UNPLUG:
+                self.state.unplugged = True
+            return None
+        if transaction == GET_REPORT:
+            return self.get_report(parameter, message[1:])
+        if transaction == SET_REPORT:
+            return self.set_report(parameter, message[1:])
+        if transaction == GET_PROTOCOL:
+            return bytes([DATA << 4, self.state.protocol])
+        if transaction == SET_PROTOCOL:
+            self.state.protocol = parameter & 0x01
+            return handshake(SUCCESSFUL)
+        if transaction == GET_IDLE:
+            return bytes([DATA << 4, self.state.idle_rate])
+        if transaction == SET_IDLE:
+            if len(message) < 2:
+                return handshake(ERR_INVALID_PARAMETER)
+            self.state.idle_rate = message[1]
+            return handshake(SUCCESSFUL)
+        if transaction in (HANDSHAKE, DATA):
+            return None
+        return handshake(ERR_UNSUPPORTED_REQUEST)
+
+    def get_report(self, parameter, body):
+        kind = REPORT_TYPES.get(parameter & 0x03)
+        report_id = body[0] if body else 0
+        report = self.formats.get((kind, report_id))
+        if report is None:
+            return handshake(ERR_INVALID_REPORT_ID)
+        data = bytearray(report.length - 2)
+        keyboard_report_id, led_offset = self.state.keyboard
+        if (kind, report_id) == ('output', keyboard_report_id) and self.state.leds is not None:
+            data[led_offset - 2] = self.state.leds
+        # Semua input report dilaporkan dalam keadaan dilepas (tidak ada tombol yang ditahan antar report)
+        message = bytes([DATA << 4 | parameter & 0x03, report_id]) + bytes(data)
+        if parameter & 0x08 and len(body) >= 3:
+            # Host membatasi ukuran buffer (termasuk report ID, tanpa byte header)
+            message = message[:1 + int.from_bytes(body[1:3], 'little')]
+        return message
+
+    def set_report(self, parameter, body):
+        kind = REPORT_TYPES.get(parameter & 0x03)
+        if not body or (kind, body[0]) not in self.formats:
+            return handshake(ERR_INVALID_REPORT_ID)
+        if kind == 'output':
+            self.state.set_output_report(body[0], body[1:])
+        return handshake(SUCCESSFUL)
+
+def handshake(result):
+    return bytes([HANDSHAKE << 4 | result])
@@ -0,0 +1,301 @@
+# Report descriptor asli: keyboard (report ID 0x01), feature vendor dan collection power/vendor. Array
+# keycode report 0x01 memakai rentang 0x00-0xFF (bukan 0x65) supaya F13-F24, tombol edit (UNDO, COPY, ...)
+# dan MUTE/VOLUMEUP/VOLUMEDOWN page keyboard tidak dibuang host
+_BASE_DESCRIPTOR = "05010906a101850105071500250119e029e775019508810295057501050819012905910295017503910395087501150025010600ff0903810395067508150026ff00050719002aff0081009501750115002501050c09008101950175010601ff09038102050c09409501750181029501750581030602ff09558555150026ff0075089540b1a2c00600ff0914a101859005847501950315002501096105850944094681029505810175089501150026ff0009658102c00600ff094ba1010600ff094b150026ff008520956b75088102094b852196890275088102094b8522953e75088102c0"
+# Consumer control (report ID 0x03) untuk tombol media: satu usage 16 bit 0x000-0x3FF dari page 0x0C
+_CONSUMER_COLLECTION = (
+    "050c0901a1018503"
+    "150026ff0319002aff0375109501"
+    "8100"
+    "c0"
+)
+# Keyboard kedua untuk mode NKRO (report ID 0x02): byte modifier (0xE0-0xE7) lalu bitmap 224 bit
+# untuk usage 0x00-0xDF. Report ID 0x01 tetap ada untuk perintah selain STRING
+_NKRO_COLLECTION = (
+    "05010906a1018502"
+    "050719e029e715002501750195088102"
+    "190029df96e0008102"
+    "c0"
+)
+
+# Report descriptor HID per mode report (lihat REPORT_MODES di duckyscript_compiler.py)
+HID_DESCRIPTORS = {
+    'boot': _BASE_DESCRIPTOR + _CONSUMER_COLLECTION,
+    'nkro': _BASE_DESCRIPTOR + _CONSUMER_COLLECTION + _NKRO_COLLECTION,
+}
+
+# Format keyboard boot protocol (HID 1.11 Appendix B.1, dengan keycode 0x00-0xFF). Di HIDP frame boot
+# tetap membawa report ID keyboard 0x01: input a1 01 <modifier> 00 <6 keycode>, output a2 01 <led>.
+# Tidak didaftarkan lewat SDP, hanya dipakai membaca dan menulis frame saat host memilih boot protocol
+BOOT_DESCRIPTOR = (
+    "05010906a1018501"
+    "050719e029e715002501750195088102"
+    "950175088101"
+    "950575010508190129059102950175039101"
+    "95067508150026ff00050719002aff008100"
+    "c0"
+)
+
+
+# Jenis main item -> jenis report
+MAIN_ITEMS = {0x8: 'input', 0x9: 'output', 0xb: 'feature'}
+# Awal frame HIDP per jenis report (DATA | Input / Output / Feature)
+HIDP_HEADERS = {'input': 0xa1, 'output': 0xa2, 'feature': 0xa3}
+
+USAGE_PAGE_KEYBOARD = 0x07
+USAGE_PAGE_LED = 0x08
+USAGE_PAGE_CONSUMER = 0x0c
+
+
+class DescriptorMismatch(ValueError):
+    pass
+
+
+class ReportField:
+    # Satu main item: count elemen masing-masing size bit mulai dari bit_offset di data report
+    def __init__(self, bit_offset, size, count, flags, usage_page, usages, logical_minimum, logical_maximum):
+        self.bit_offset = bit_offset
+        self.size = size
+        self.count = count
+        self.flags = flags
+        self.usage_page = usage_page
+        self.usages = usages
+        self.logical_minimum = logical_minimum
+        self.logical_maximum = logical_maximum
+
+    @property
+    def constant(self):
+        return bool(self.flags & 0x01)
+
+    @property
+    def variable(self):
+        return bool(self.flags & 0x02)
+
+    def values(self, data):
+        # Nilai setiap elemen field dari data report (tanpa header HIDP dan report ID)
+        number = int.from_bytes(data, 'little')
+        mask = (1 << self.size) - 1
+        return [number >> (self.bit_offset + i * self.size) & mask for i in range(self.count)]
+
+
+class ReportFormat:
+    def __init__(self, kind, report_id):
+        self.kind = kind
+        self.report_id = report_id
+        self.fields = []
+        self.bits = 0
+
+    @property
+    def length(self):
+        # Panjang frame yang dikirim: header HIDP, report ID, lalu data report
+        return 2 + (self.bits + 7) // 8
+
+    def field(self, usage_page, variable, size, first_usage=None):
+        for field in self.fields:
+            if (not field.constant and field.usage_page == usage_page and field.variable == variable
+                    and field.size == size and first_usage in (None, _usage(field, 0))):
+                return field
+        return None
+
+
+def parse_descriptor(descriptor):
+    # descriptor berupa string hex (seperti di ServiceRecord SDP) atau bytes.
+    # Hasilnya {(jenis report, report ID): ReportFormat}; hanya short item yang didukung
+    if isinstance(descriptor, str):
+        descriptor = bytes.fromhex(descriptor)
+    formats = {}
+    state = {'usage_page': 0, 'logical_minimum': 0, 'logical_maximum': 0, 'report_size': 0,
+             'report_count': 0, 'report_id': 0}
+    stack = []
+    usages = []
+    usage_range = [None, None]
+    position = 0
+    while position < len(descriptor):
+        prefix = descriptor[position]
+        if prefix == 0xfe:
+            raise DescriptorMismatch(f"Long item at offset {position} is not supported")
+        size = (0, 1, 2, 4)[prefix & 0x03]
+        item_type = prefix >> 2 & 0x03
+        tag = prefix >> 4
+        data = descriptor[position + 1:position + 1 + size]
+        if len(data) != size:
+            raise DescriptorMismatch(f"Truncated item at offset {position}")
+        position += 1 + size
+        value = int.from_bytes(data, 'little')
+
+        if item_type == 0:
+            kind = MAIN_ITEMS.get(tag)
+            if kind is not None:
+                report = formats.get((kind, state['report_id']))
+                if report is None:
+                    report = formats[kind, state['report_id']] = ReportFormat(kind, state['report_id'])
+                if not usages and usage_range[0] is not None:
+                    usages = list(range(usage_range[0], usage_range[1] + 1))
+                report.fields.append(ReportField(report.bits, state['report_size'], state['report_count'], value,
+                                                 state['usage_page'], usages, state['logical_minimum'],
+                                                 state['logical_maximum']))
+                report.bits += state['report_size'] * state['report_count']
+            # Collection / End Collection dan main item lain mengosongkan state local
+            usages = []
+            usage_range = [None, None]
+        elif item_type == 1:
+            if tag == 0x0:
+                state['usage_page'] = value
+            elif tag == 0x1:
+                state['logical_minimum'] = int.from_bytes(data, 'little', signed=True)
+            elif tag == 0x2:
+                # Logical Maximum 0xFF dengan minimum 0 lazim ditulis tanpa byte tanda
+                maximum = int.from_bytes(data, 'little', signed=True)
+                state['logical_maximum'] = value if maximum < 0 <= state['logical_minimum'] else maximum
+            elif tag == 0x7:
+                state['report_size'] = value
+            elif tag == 0x8:
+                state['report_id'] = value
+            elif tag == 0x9:
+                state['report_count'] = value
+            elif tag == 0xa:
+                stack.append(dict(state))
+            elif tag == 0xb:
+                state = stack.pop()
+        elif item_type == 2:
+            # Usage 4 byte membawa usage page di 16 bit atas; di sini hanya 16 bit bawah yang dipakai
+            if tag == 0x0:
+                usages.append(value & 0xffff)
+            elif tag == 0x1:
+                usage_range[0] = value & 0xffff
+            elif tag == 0x2:
+                usage_range[1] = value & 0xffff
+    return formats
+
+def _usage(field, index):
+    # Field variable dengan usage lebih sedikit dari count memakai usage terakhir untuk sisanya
+    return field.usages[min(index, len(field.usages) - 1)] if field.usages else 0
+
+def decode_report(formats, frame):
+    # Usage yang aktif pada frame, per usage page; dipakai self-check encoder terhadap deskriptor
+    kind = {header: kind for kind, header in HIDP_HEADERS.items()}.get(frame[0])
+    report = formats.get((kind, frame[1]))
+    if report is None:
+        raise DescriptorMismatch(f"Report {frame[:2].hex()} is not declared in the descriptor")
+    if len(frame) != report.length:
+        raise DescriptorMismatch(f"Report {frame[:2].hex()} is {len(frame)} bytes, the descriptor declares {report.length}")
+    active = {}
+    for field in report.fields:
+        values = field.values(frame[2:])
+        if field.constant:
+            if any(values):
+                raise DescriptorMismatch(f"Report {frame.hex()} sets constant bits at bit {field.bit_offset}")
+            continue
+        if field.variable:
+            used = [_usage(field, i) for i, value in enumerate(values) if value]
+        else:
+            for value in values:
+                if not field.logical_minimum <= value <= field.logical_maximum:
+                    raise DescriptorMismatch(f"Report {frame.hex()} has value {value:#x} outside the logical range")
+            used = [_usage(field, 0) + value - field.logical_minimum for value in values if value]
+        if used:
+            active.setdefault(field.usage_page, []).extend(used)
+    return {page: sorted(usages) for page, usages in active.items()}
+
+
+class ReportLayout:
+    # Posisi byte (di dalam frame HIDP) dari field yang dipakai encoder, diturunkan dari deskriptor.
+    # Report yang tidak ada di deskriptor bernilai None
+    def __init__(self, formats):
+        self.formats = formats
+        self.keyboard_id = self.nkro_id = self.consumer_id = None
+        for (kind, report_id), report in sorted(formats.items()):
+            if kind == 'input':
+                keys = report.field(USAGE_PAGE_KEYBOARD, False, 8)
+                bitmap = report.field(USAGE_PAGE_KEYBOARD, True, 1, 0)
+                if keys is not None and self.keyboard_id is None:
+                    self.keyboard_id = report_id
+                    self.keyboard_length = report.length
+                    self.modifier_offset = self._modifier_offset(report)
+                    self.key_offset = self._byte_offset(report, keys)
+                    self.key_slots = keys.count
+                elif bitmap is not None and self.nkro_id is None:
+                    self.nkro_id = report_id
+                    self.nkro_length = report.length
+                    self.nkro_modifier_offset = self._modifier_offset(report)
+                    self.nkro_bitmap_offset = self._byte_offset(report, bitmap)
+                    self.nkro_usage_count = bitmap.count
+                consumer = report.field(USAGE_PAGE_CONSUMER, False, 16)
+                if consumer is not None and self.consumer_id is None:
+                    self.consumer_id = report_id
+                    self.consumer_length = report.length
+                    self.consumer_offset = self._byte_offset(report, consumer)
+            elif kind == 'output' and report_id == self.keyboard_id:
+                leds = report.field(USAGE_PAGE_LED, True, 1)
+                if leds is not None and 2 in leds.usages:
+                    # Usage LED 0x02 = Caps Lock
+                    bit = leds.bit_offset + leds.usages.index(2)
+                    self.led_offset = 2 + bit // 8
+                    self.caps_lock_led = 1 << bit % 8
+        if self.keyboard_id is None:
+            raise DescriptorMismatch("The descriptor declares no keyboard input report")
+
+    @staticmethod
+    def _byte_offset(report, field):
+        if field.bit_offset % 8:
+            raise DescriptorMismatch(f"Report {report.report_id:#04x}: field at bit {field.bit_offset} is not byte aligned")
+        return 2 + field.bit_offset // 8
+
+    def _modifier_offset(self, report):
+        field = report.field(USAGE_PAGE_KEYBOARD, True, 1, 0xe0)
+        if field is None or field.count != 8:
+            raise DescriptorMismatch(f"Report {report.report_id:#04x} declares no modifier byte (usages 0xE0-0xE7)")
+        return self._byte_offset(report, field)
+
+
+_LAYOUTS = {}
+
+def report_layout(descriptor):
+    # Deskriptor yang sama hanya di-parse sekali
+    layout = _LAYOUTS.get(descriptor)
+    if layout is None:
+        layout = _LAYOUTS[descriptor] = ReportLayout(parse_descriptor(descriptor))
+    return layout
+
+def _template(report_id, length):
+    return bytes([HIDP_HEADERS['input'], report_id] + [0] * (length - 2))
+
+def keyboard_encoder(layout):
+    # Encoder khusus untuk layout ini: offset dan panjang sudah terikat di closure
+    template = _template(layout.keyboard_id, layout.keyboard_length)
+    modifier_offset = layout.modifier_offset
+    key_offset = layout.key_offset
+    key_slots = layout.key_slots
+
+    def encode(modifiers, keycodes):
+        assert(len(keycodes) <= key_slots)
+        report = bytearray(template)
+        report[modifier_offset] = modifiers
+        report[key_offset:key_offset + len(keycodes)] = bytes(keycodes)
+        return bytes(report)
+    return encode
+
+def nkro_encoder(layout):
+    template = _template(layout.nkro_id, layout.nkro_length)
+    modifier_offset = layout.nkro_modifier_offset
+    bitmap_offset = layout.nkro_bitmap_offset
+    usage_count = layout.nkro_usage_count
+
+    def encode(modifiers, keycodes):
+        report = bytearray(template)
+        report[modifier_offset] = modifiers
+        for keycode in keycodes:
+            assert(keycode < usage_count)
+            report[bitmap_offset + (keycode >> 3)] |= 1 << (keycode & 7)
+        return bytes(report)
+    return encode
+
+def consumer_encoder(layout):
+    template = _template(layout.consumer_id, layout.consumer_length)
+    offset = layout.consumer_offset
+
+    def encode(usage):
+        report = bytearray(template)
+        report[offset:offset + 2] = usage.to_bytes(2, 'little')
+        return bytes(report)
+    return encode
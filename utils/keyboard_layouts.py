@@ -0,0 +1,103 @@
+from utils.magic_keyboard_hid import KEYCODES, MODIFIERS
+
+SHIFT = MODIFIERS['SHIFT']
+ALTGR = MODIFIERS['RIGHTALT']
+
+# Spesifikasi layout: karakter -> nama tombol, (modifier, nama tombol), atau
+# list stroke untuk dead key (tombol dead key lalu SPACE)
+_US = {
+    ' ': 'SPACE', '\t': 'TAB', '\n': 'ENTER',
+    '-': 'MINUS', '=': 'EQUAL', '[': 'LEFTBRACE', ']': 'RIGHTBRACE',
+    '\\': 'BACKSLASH', ';': 'SEMICOLON', "'": 'QUOTE', '`': 'BACKTICK',
+    ',': 'COMMA', '.': 'DOT', '/': 'SLASH',
+    '!': (SHIFT, '_1'), '@': (SHIFT, '_2'), '#': (SHIFT, '_3'), '$': (SHIFT, '_4'),
+    '%': (SHIFT, '_5'), '^': (SHIFT, '_6'), '&': (SHIFT, '_7'), '*': (SHIFT, '_8'),
+    '(': (SHIFT, '_9'), ')': (SHIFT, '_0'), '_': (SHIFT, 'MINUS'), '+': (SHIFT, 'EQUAL'),
+    '{': (SHIFT, 'LEFTBRACE'), '}': (SHIFT, 'RIGHTBRACE'), '|': (SHIFT, 'BACKSLASH'),
+    ':': (SHIFT, 'SEMICOLON'), '"': (SHIFT, 'QUOTE'), '~': (SHIFT, 'BACKTICK'),
+    '<': (SHIFT, 'COMMA'), '>': (SHIFT, 'DOT'), '?': (SHIFT, 'SLASH'),
+}
+
+_UK = dict(_US, **{
+    '"': (SHIFT, '_2'), '@': (SHIFT, 'QUOTE'), '£': (SHIFT, '_3'),
+    '#': 'NONUS_HASH', '~': (SHIFT, 'NONUS_HASH'),
+    '\\': 'NONUS_BACKSLASH', '|': (SHIFT, 'NONUS_BACKSLASH'),
+    '¬': (SHIFT, 'BACKTICK'), '€': (ALTGR, '_4'),
+})
+
+_DE = dict(_US, **{
+    'y': 'z', 'z': 'y',
+    '!': (SHIFT, '_1'), '"': (SHIFT, '_2'), '§': (SHIFT, '_3'), '$': (SHIFT, '_4'),
+    '%': (SHIFT, '_5'), '&': (SHIFT, '_6'), '/': (SHIFT, '_7'), '(': (SHIFT, '_8'),
+    ')': (SHIFT, '_9'), '=': (SHIFT, '_0'),
+    'ß': 'MINUS', '?': (SHIFT, 'MINUS'), '\\': (ALTGR, 'MINUS'),
+    '´': ['EQUAL', 'SPACE'], '`': [(SHIFT, 'EQUAL'), 'SPACE'],
+    'ü': 'LEFTBRACE', 'Ü': (SHIFT, 'LEFTBRACE'),
+    '+': 'RIGHTBRACE', '*': (SHIFT, 'RIGHTBRACE'), '~': (ALTGR, 'RIGHTBRACE'),
+    'ö': 'SEMICOLON', 'Ö': (SHIFT, 'SEMICOLON'),
+    'ä': 'QUOTE', 'Ä': (SHIFT, 'QUOTE'),
+    '#': 'NONUS_HASH', "'": (SHIFT, 'NONUS_HASH'),
+    '^': ['BACKTICK', 'SPACE'], '°': (SHIFT, 'BACKTICK'),
+    ',': 'COMMA', ';': (SHIFT, 'COMMA'), '.': 'DOT', ':': (SHIFT, 'DOT'),
+    '-': 'SLASH', '_': (SHIFT, 'SLASH'),
+    '<': 'NONUS_BACKSLASH', '>': (SHIFT, 'NONUS_BACKSLASH'), '|': (ALTGR, 'NONUS_BACKSLASH'),
+    '@': (ALTGR, 'q'), '€': (ALTGR, 'e'), 'µ': (ALTGR, 'm'),
+    '²': (ALTGR, '_2'), '³': (ALTGR, '_3'),
+    '{': (ALTGR, '_7'), '[': (ALTGR, '_8'), ']': (ALTGR, '_9'), '}': (ALTGR, '_0'),
+})
+
+_FR = dict(_US, **{
+    'a': 'q', 'q': 'a', 'z': 'w', 'w': 'z', 'm': 'SEMICOLON',
+    '&': '_1', 'é': '_2', '"': '_3', "'": '_4', '(': '_5',
+    '-': '_6', 'è': '_7', '_': '_8', 'ç': '_9', 'à': '_0',
+    '1': (SHIFT, '_1'), '2': (SHIFT, '_2'), '3': (SHIFT, '_3'), '4': (SHIFT, '_4'),
+    '5': (SHIFT, '_5'), '6': (SHIFT, '_6'), '7': (SHIFT, '_7'), '8': (SHIFT, '_8'),
+    '9': (SHIFT, '_9'), '0': (SHIFT, '_0'),
+    ')': 'MINUS', '°': (SHIFT, 'MINUS'), ']': (ALTGR, 'MINUS'),
+    '=': 'EQUAL', '+': (SHIFT, 'EQUAL'), '}': (ALTGR, 'EQUAL'),
+    '^': ['LEFTBRACE', 'SPACE'], '¨': [(SHIFT, 'LEFTBRACE'), 'SPACE'],
+    '$': 'RIGHTBRACE', '£': (SHIFT, 'RIGHTBRACE'),
+    'ù': 'QUOTE', '%': (SHIFT, 'QUOTE'),
+    '*': 'NONUS_HASH', 'µ': (SHIFT, 'NONUS_HASH'),
+    ',': 'm', '?': (SHIFT, 'm'), ';': 'COMMA', '.': (SHIFT, 'COMMA'),
+    ':': 'DOT', '/': (SHIFT, 'DOT'), '!': 'SLASH', '§': (SHIFT, 'SLASH'),
+    '<': 'NONUS_BACKSLASH', '>': (SHIFT, 'NONUS_BACKSLASH'), '²': 'BACKTICK',
+    '~': [(ALTGR, '_2'), 'SPACE'], '#': (ALTGR, '_3'), '{': (ALTGR, '_4'),
+    '[': (ALTGR, '_5'), '|': (ALTGR, '_6'), '`': [(ALTGR, '_7'), 'SPACE'],
+    '\\': (ALTGR, '_8'), '@': (ALTGR, '_0'), '€': (ALTGR, 'e'),
+})
+
+LAYOUT_SPECS = {
+    'us': _US,
+    'uk': _UK,
+    'de': _DE,
+    'fr': _FR,
+    # Keyboard Indonesia memakai susunan US
+    'id': _US,
+}
+
+
+def _stroke(entry):
+    if isinstance(entry, tuple):
+        modifiers, name = entry
+    else:
+        modifiers, name = 0, entry
+    return (modifiers, KEYCODES[name])
+
+def _build_layout(spec):
+    # Setiap karakter dipetakan langsung ke tuple stroke (modifier, keycode)
+    letters = {char: spec.get(char, char) for char in "abcdefghijklmnopqrstuvwxyz"}
+    table = {}
+    for char, name in letters.items():
+        table[char] = (_stroke(name),)
+        table[char.upper()] = ((SHIFT, _stroke(name)[1]),)
+    for char in "0123456789":
+        table[char] = (_stroke(f"_{char}"),)
+    for char, entry in spec.items():
+        if char in letters:
+            continue
+        strokes = entry if isinstance(entry, list) else [entry]
+        table[char] = tuple(_stroke(stroke) for stroke in strokes)
+    return table
+
+LAYOUTS = {name: _build_layout(spec) for name, spec in LAYOUT_SPECS.items()}
@@ -0,0 +1,36 @@
+import errno
+import select
+import time
+
+# Socket L2CAP dipakai non-blocking; saat buffer controller penuh, thread pengirim menunggu di poll()
+# sampai socket siap alih-alih mencoba ulang dengan sleep atau spin. Penerimaan berjalan di event loop
+# (AsyncL2CAPClient.recv)
+WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK)
+RECV_SIZE = 64
+
+
+class SocketPoller:
+    # Objek poll() didaftarkan sekali saat socket terhubung
+    def __init__(self, sock):
+        self.writable = select.poll()
+        self.writable.register(sock.fileno(), select.POLLOUT)
+
+
+def _poll_ms(seconds):
+    # poll() memakai milidetik; sisa waktu yang sangat kecil dibulatkan ke atas supaya tidak jadi spin
+    return max(int(seconds * 1000 + 0.999), 0)
+
+def send_when_writable(sock, poller, data, timeout=0.5):
+    # True jika terkirim, False jika socket tidak pernah writable selama timeout.
+    # Error selain "would block" (misalnya link putus) diteruskan ke pemanggil
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            sock.send(data)
+            return True
+        except OSError as ex:
+            if ex.errno not in WOULD_BLOCK:
+                raise
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not poller.writable.poll(_poll_ms(remaining)):
+            return False
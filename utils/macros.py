@@ -0,0 +1,72 @@
+import hashlib
+import json
+import logging as log
+import os
+
+# Macro: nama perintah -> daftar baris DuckyScript. Jeda antar report ditulis eksplisit sebagai DELAY
+# supaya bisa disetel; HOLD menahan kombinasi tombol sampai RELEASE
+TARGET_OSES = ('android', 'windows', 'macos', 'linux')
+DEFAULT_OS = 'android'
+
+# Macro tambahan milik pengguna, format sama dengan DEFAULT_MACROS.
+# Kunci "all" berlaku untuk semua OS, kunci OS menimpa macro dengan nama yang sama
+MACRO_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'macros.json')
+
+DEFAULT_MACROS = {
+    'android': {
+        'PRIVATE_BROWSER': ["HOLD CTRL SHIFT n", "RELEASE"],
+        'VOLUME_UP': ["MEDIAVOLUMEUP"],
+    },
+    'windows': {
+        'PRIVATE_BROWSER': ["CTRL SHIFT n"],
+        'VOLUME_UP': ["MEDIAVOLUMEUP"],
+    },
+    'macos': {
+        'PRIVATE_BROWSER': ["COMMAND SHIFT n"],
+        'VOLUME_UP': ["MEDIAVOLUMEUP"],
+    },
+    'linux': {
+        'PRIVATE_BROWSER': ["CTRL SHIFT n"],
+        'VOLUME_UP': ["MEDIAVOLUMEUP"],
+    },
+}
+
+
+def load_macros(path=MACRO_FILE):
+    macros = {name: dict(table) for name, table in DEFAULT_MACROS.items()}
+    if not os.path.exists(path):
+        return macros
+    try:
+        with open(path) as file:
+            user_macros = json.load(file)
+    except (OSError, ValueError) as e:
+        log.warning(f"Ignoring unreadable macro file {path}: {e}")
+        return macros
+    shared = user_macros.get('all', {})
+    for target_os in TARGET_OSES:
+        macros[target_os].update(shared)
+        macros[target_os].update(user_macros.get(target_os, {}))
+    return macros
+
+MACROS = load_macros()
+_selected = {'os': DEFAULT_OS}
+
+
+def select_target_os(target_os):
+    if target_os not in MACROS:
+        raise ValueError(f"Unknown target OS: {target_os}")
+    _selected['os'] = target_os
+
+def target_os():
+    return _selected['os']
+
+def macro_names():
+    return {name for table in MACROS.values() for name in table}
+
+def macro_lines(name):
+    return MACROS[_selected['os']].get(name)
+
+def macro_fingerprint():
+    # Ikut dalam kunci cache: payload yang sama untuk OS atau definisi macro lain menghasilkan report lain
+    table = json.dumps(MACROS[_selected['os']], sort_keys=True)
+    return f"{_selected['os']}-{hashlib.sha256(table.encode()).hexdigest()[:16]}"
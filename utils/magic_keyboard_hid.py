@@ -1,5 +1,20 @@
 from enum import Enum
 
+class Modifier_Codes(Enum):
+    CTRL = 0x01
+    RIGHTCTRL = 0x10
+
+    SHIFT = 0x02
+    RIGHTSHIFT = 0x20
+
+    ALT = 0x04
+    RIGHTALT = 0x40
+
+    GUI = 0x08
+    WINDOWS = 0x08
+    COMMAND = 0x08
+    RIGHTGUI = 0x80
+
 class Key_Codes(Enum):
     NONE = 0x00
     a = 0x04
@@ -74,6 +89,7 @@ class Key_Codes(Enum):
     LEFTBRACE = 0x2f
     RIGHTBRACE = 0x30
     BACKSLASH = 0x31
+    NONUS_HASH = 0x32
     SEMICOLON = 0x33
     QUOTE = 0x34
     BACKTICK = 0x35
@@ -123,6 +139,7 @@ class Key_Codes(Enum):
     KEYPAD9 = 0x61
     KEYPAD0 = 0x62
     KEYPADDELETE = 0x63
+    NONUS_BACKSLASH = 0x64
     KEYPADCOMPOSE = 0x65
     KEYPADPOWER = 0x66
     KEYPADEQUAL = 0x67
@@ -172,3 +189,38 @@ class Key_Codes(Enum):
     MEDIACOFFEE = 0xf9
     MEDIAREFRESH = 0xfa
     MEDIACALC = 0xfb
+
+    # Nama dari salinan Enum lama di CLI.py dan GNOME.py
+    PERIOD = 0x37
+    PIPE = 0x31
+    GRAVE = 0x35
+    APOSTROPHE = 0x34
+    LEFT_BRACKET = 0x2f
+    RIGHT_BRACKET = 0x30
+    EXCLAMATION_MARK = 0x1e
+    AT_SYMBOL = 0x1f
+    HASHTAG = 0x20
+    DOLLAR = 0x21
+    PERCENT_SYMBOL = 0x22
+    CARET_SYMBOL = 0x23
+    AMPERSAND_SYMBOL = 0x24
+    ASTERISK_SYMBOL = 0x25
+    OPEN_PARENTHESIS = 0x26
+    CLOSE_PARENTHESIS = 0x27
+    UNDERSCORE_SYMBOL = 0x2d
+    QUESTIONMARK = 0x38
+
+# Keymap integer (nama -> kode) untuk jalur encode: tanpa isinstance dan .value per tombol
+KEYCODES = {name: member.value for name, member in Key_Codes.__members__.items()}
+MODIFIERS = {name: member.value for name, member in Modifier_Codes.__members__.items()}
+# Nama yang sebenarnya karakter dengan Shift (EXCLAMATION_MARK = Shift+1, QUESTIONMARK = Shift+/):
+# bukan nama tombol DuckyScript, dan dikirim bersama Shift lewat MEMBER_CODES
+SHIFTED_KEY_NAMES = {
+    'PIPE', 'EXCLAMATION_MARK', 'AT_SYMBOL', 'HASHTAG', 'DOLLAR', 'PERCENT_SYMBOL', 'CARET_SYMBOL',
+    'AMPERSAND_SYMBOL', 'ASTERISK_SYMBOL', 'OPEN_PARENTHESIS', 'CLOSE_PARENTHESIS', 'UNDERSCORE_SYMBOL',
+    'QUESTIONMARK',
+}
+# Member Enum -> (modifier, keycode), untuk kode lama yang masih mengirim Key_Codes/Modifier_Codes
+MEMBER_CODES = {member: (Modifier_Codes.SHIFT.value if name in SHIFTED_KEY_NAMES else 0, member.value)
+                for name, member in Key_Codes.__members__.items()}
+MEMBER_CODES.update((member, (member.value, 0)) for member in Modifier_Codes.__members__.values())
@@ -144,6 +144,17 @@ def read_duckyscript(filename):
         log.warning(f"File {filename} not found. Skipping DuckyScript.")
         return None
 
+# Membaca DuckyScript baris per baris beserta byte offset-nya, tanpa memuat seluruh file
+def stream_duckyscript(filename, offset=0):
+    if not os.path.exists(filename):
+        log.warning(f"File {filename} not found. Skipping DuckyScript.")
+        return
+    with open(filename, 'rb') as file:
+        file.seek(offset)
+        for raw in file:
+            yield offset, raw.decode(errors='replace').strip()
+            offset += len(raw)
+
 # Fungsi untuk memuat perangkat yang sudah dikenal
 def load_known_devices(filename='known_devices.txt'):
     if os.path.exists(filename):
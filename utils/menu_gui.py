@@ -16,6 +16,16 @@ def read_duckyscript(filename):
         log.warning(f"File {filename} not found. Skipping DuckyScript.")
         return None
 
+def stream_duckyscript(filename, offset=0):
+    if not os.path.exists(filename):
+        log.warning(f"File {filename} not found. Skipping DuckyScript.")
+        return
+    with open(filename, 'rb') as file:
+        file.seek(offset)
+        for raw in file:
+            yield offset, raw.decode(errors='replace').strip()
+            offset += len(raw)
+
 def load_known_devices(filename='known_devices.txt'):
     if os.path.exists(filename):
         with open(filename, 'r') as file:
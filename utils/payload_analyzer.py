@@ -0,0 +1,70 @@
+import logging as log
+
+from utils.duckyscript_compiler import iter_line_blocks, start_block
+from utils.duckyscript_vm import compile_program, is_control_line, uses_control_flow
+from utils.menu_functions import stream_duckyscript
+from utils.payload_template import substitute
+
+# Batas jumlah report yang dihitung untuk program DuckyScript 3 (WHILE TRUE tidak pernah selesai)
+DRY_RUN_REPORT_LIMIT = 10000000
+
+
+class PayloadAnalysis:
+    def __init__(self):
+        self.report_count = 0
+        self.duration = 0.0
+        self.issues = []
+        # False jika program berhenti dihitung karena melewati DRY_RUN_REPORT_LIMIT
+        self.complete = True
+
+
+def _lines(filename, variables):
+    return (substitute(line, variables) for _, line in stream_duckyscript(filename))
+
+def analyze_payload(filename, layout='us', variables=None):
+    # Kompilasi tanpa Bluetooth: jumlah report, estimasi durasi dan input yang akan dilewati
+    analysis = PayloadAnalysis()
+    variables = variables or {}
+    # Peringatan sudah dikumpulkan per baris, jadi log dari compiler tidak perlu ditampilkan
+    logger = log.getLogger()
+    level = logger.level
+    logger.setLevel(log.ERROR)
+    try:
+        control_flow = uses_control_flow(_lines(filename, variables))
+        start = start_block()
+        analysis.report_count = len(start)
+        analysis.duration = start.total_duration()
+        for line_number, line in enumerate(_lines(filename, variables), start=1):
+            if control_flow and is_control_line(line):
+                continue
+            # STRINGFILE dihitung per potongan file supaya memori tetap kecil
+            for _, line_block in iter_line_blocks(line, layout):
+                analysis.issues.extend((line_number, issue) for issue in line_block.issues)
+                if not control_flow:
+                    analysis.report_count += len(line_block)
+                    analysis.duration += line_block.total_duration()
+        if control_flow:
+            analysis.report_count = 0
+            analysis.duration = 0.0
+            program = compile_program(_lines(filename, variables), layout)
+            for index, _, delay in program.iter_from(0):
+                if index >= DRY_RUN_REPORT_LIMIT:
+                    analysis.complete = False
+                    break
+                analysis.report_count += 1
+                analysis.duration += delay
+    finally:
+        logger.setLevel(level)
+    return analysis
+
+def print_analysis(filename, analysis):
+    bound = "" if analysis.complete else "at least "
+    print(f"Dry run: {filename}")
+    print(f"   ➤ Reports        : {bound}{analysis.report_count}")
+    print(f"   ➤ Estimated time : {bound}{analysis.duration:.2f}s")
+    if not analysis.issues:
+        print("   ➤ Unsupported    : none")
+        return
+    print(f"   ➤ Unsupported    : {len(analysis.issues)}")
+    for line_number, issue in analysis.issues:
+        print(f"       line {line_number}: {issue}")
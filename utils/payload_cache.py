@@ -0,0 +1,282 @@
+import hashlib
+import logging as log
+import mmap
+import os
+import pickle
+import struct
+
+from utils.duckyscript_compiler import (MAX_REPORT_LENGTH, LineCache, compile_duckyscript, encoder_fingerprint,
+                                        iter_reports, report_slot, start_block)
+from utils.duckyscript_vm import compile_program, is_control_line
+from utils.payload_template import TemplatePayload, compile_template, has_placeholder, substitute
+from utils.menu_functions import stream_duckyscript
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'compiled')
+
+# Header: magic, versi format, panjang slot report, jumlah report
+CACHE_MAGIC = b"BDKC"
+CACHE_FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+HASH_CHUNK_SIZE = 1 << 20
+WRITE_CHUNK_RECORDS = 4096
+WRITE_CHUNK_SIZE = 1 << 16
+# Di atas ukuran ini payload dikompilasi streaming tanpa cache per baris supaya memori tetap kecil
+LINE_CACHE_MAX_SOURCE = 8 << 20
+# Setiap record: panjang report (1 byte) + slot report + delay dalam mikrodetik (uint32)
+RECORD_PREFIX = struct.Struct("<B")
+RECORD_DELAY = struct.Struct("<I")
+
+
+def _tmp_path(path):
+    # PID di nama file sementara supaya beberapa proses compile-all tidak saling menimpa
+    return f"{path}.{os.getpid()}.tmp"
+
+def cache_key(filename, layout='us'):
+    digest = hashlib.sha256()
+    digest.update(f"{encoder_fingerprint()}:{layout}:".encode())
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_path(key, cache_dir=CACHE_DIR, suffix='bin'):
+    # .bin untuk program datar (mmap), .vm untuk program DuckyScript 3 (pickle)
+    return os.path.join(cache_dir, f"{key}.{suffix}")
+
+
+def line_cache_path(filename, layout='us', cache_dir=CACHE_DIR):
+    # Cache per baris dikunci dengan path payload (bukan isinya) supaya bisa dipakai lagi setelah diedit
+    digest = hashlib.sha256(f"{encoder_fingerprint()}:{layout}:{os.path.realpath(filename)}".encode())
+    return os.path.join(cache_dir, f"lines-{digest.hexdigest()}.pickle")
+
+def load_line_cache(filename, layout='us', cache_dir=CACHE_DIR):
+    path = line_cache_path(filename, layout, cache_dir)
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as file:
+                return pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            log.warning(f"Ignoring unreadable line cache {path}: {e}")
+    return LineCache(layout)
+
+def replace_program(line_cache, path):
+    # Setiap edit payload menghasilkan kunci cache baru; file program sebelumnya untuk path yang sama
+    # dihapus supaya compiled/ tidak terus bertambah (~13 MB per edit untuk payload 20k baris)
+    previous = getattr(line_cache, 'program', None)
+    line_cache.program = os.path.basename(path)
+    if previous and previous != line_cache.program:
+        try:
+            os.unlink(os.path.join(os.path.dirname(path), previous))
+            log.debug(f"Removed superseded compiled payload {previous}")
+        except FileNotFoundError:
+            pass
+
+def save_line_cache(line_cache, filename, cache_dir=CACHE_DIR):
+    line_cache.prune()
+    path = line_cache_path(filename, line_cache.layout, cache_dir)
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, 'wb') as file:
+        pickle.dump(line_cache, file)
+    os.replace(tmp_path, path)
+
+
+class MappedPayload:
+    # Program hasil kompilasi yang dibaca langsung dari file cache lewat mmap
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, slot, count = HEADER.unpack_from(self.mm, 0)
+        if magic != CACHE_MAGIC or version != CACHE_FORMAT_VERSION:
+            self.mm.close()
+            raise ValueError(f"Invalid compiled payload file: {path}")
+        self.slot = slot
+        self.count = count
+        self.stride = RECORD_PREFIX.size + slot + RECORD_DELAY.size
+
+    def __len__(self):
+        return self.count
+
+    def _offset(self, index):
+        return HEADER.size + index * self.stride
+
+    def delay_at(self, index):
+        offset = self._offset(index) + RECORD_PREFIX.size + self.slot
+        return RECORD_DELAY.unpack_from(self.mm, offset)[0] / 1000000
+
+    def iter_from(self, index=0):
+        mm = self.mm
+        stride = self.stride
+        delay_offset = RECORD_PREFIX.size + self.slot
+        offset = self._offset(index)
+        for i in range(index, self.count):
+            length = mm[offset]
+            delay_us = RECORD_DELAY.unpack_from(mm, offset + delay_offset)[0]
+            yield i, mm[offset + 1:offset + 1 + length], delay_us / 1000000
+            offset += stride
+
+    def total_duration(self):
+        return sum(self.delay_at(i) for i in range(self.count))
+
+    def close(self):
+        self.mm.close()
+
+
+def _delay_us(delay):
+    return int(delay * 1000000 + 0.5)
+
+def _pack_block(block, record):
+    return b"".join(record.pack(len(report), report, _delay_us(delay))
+                    for report, delay in zip(block.reports, block.delays))
+
+def write_compiled_payload(path, entries, slot=MAX_REPORT_LENGTH):
+    # entries berupa iterable (report, delay) sehingga file bisa ditulis secara streaming
+    record = struct.Struct(f"<B{slot}sI")
+    count = 0
+    chunk = []
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, 'wb') as file:
+        file.write(HEADER.pack(CACHE_MAGIC, CACHE_FORMAT_VERSION, slot, 0))
+        for report, delay in entries:
+            chunk.append(record.pack(len(report), report, _delay_us(delay)))
+            if len(chunk) == WRITE_CHUNK_RECORDS:
+                file.write(b"".join(chunk))
+                count += len(chunk)
+                chunk = []
+        file.write(b"".join(chunk))
+        count += len(chunk)
+        file.seek(0)
+        file.write(HEADER.pack(CACHE_MAGIC, CACHE_FORMAT_VERSION, slot, count))
+    # Rename atomik supaya pembaca lain tidak melihat file setengah jadi
+    os.replace(tmp_path, path)
+
+def write_spliced_payload(path, duckyscript, line_cache, slot=MAX_REPORT_LENGTH):
+    # Program disusun dari record biner per baris yang sudah ada di line_cache; hanya baris
+    # yang berubah yang dikompilasi dan di-pack ulang. Ditulis bertahap supaya memori tetap kecil
+    record = struct.Struct(f"<B{slot}sI")
+    delay_offset = record.size - RECORD_DELAY.size
+    count = 0
+    chunk = bytearray(_pack_block(start_block(), record))
+    tmp_path = _tmp_path(path)
+    with open(tmp_path, 'wb') as file:
+        file.write(HEADER.pack(CACHE_MAGIC, CACHE_FORMAT_VERSION, slot, 0))
+        for line in duckyscript:
+            key = line_cache.key(line)
+            entry = line_cache.packed.get(key)
+            if entry is None:
+                block = line_cache.block(key, line)
+                entry = line_cache.packed[key] = (_delay_us(block.leading_delay), _pack_block(block, record))
+            else:
+                line_cache.used.add(key)
+            leading_delay_us, packed = entry
+            if leading_delay_us:
+                # DELAY di awal baris ditambahkan ke record terakhir yang belum ditulis
+                position = len(chunk) - record.size + delay_offset
+                delay_us = RECORD_DELAY.unpack_from(chunk, position)[0]
+                RECORD_DELAY.pack_into(chunk, position, delay_us + leading_delay_us)
+            chunk += packed
+            if len(chunk) > WRITE_CHUNK_SIZE:
+                # Record terakhir ditahan supaya DELAY berikutnya masih bisa ditambahkan
+                file.write(chunk[:-record.size])
+                count += len(chunk) // record.size - 1
+                del chunk[:-record.size]
+        file.write(chunk)
+        count += len(chunk) // record.size
+        file.seek(0)
+        file.write(HEADER.pack(CACHE_MAGIC, CACHE_FORMAT_VERSION, slot, count))
+    # Rename atomik supaya pembaca lain tidak melihat file setengah jadi
+    os.replace(tmp_path, path)
+
+def _payload_lines(filename, variables=None):
+    lines = (line for _, line in stream_duckyscript(filename))
+    if variables is None:
+        return lines
+    return (substitute(line, variables) for line in lines)
+
+def _payload_features(filename):
+    # Satu kali baca untuk menentukan jalur kompilasi: STRINGFILE, DuckyScript 3, template
+    stringfile = control_flow = template = False
+    for line in _payload_lines(filename):
+        stringfile = stringfile or line.partition(" ")[0] == 'STRINGFILE'
+        control_flow = control_flow or is_control_line(line)
+        template = template or has_placeholder(line)
+    return stringfile, control_flow, template
+
+def load_compiled_payload(filename, layout='us', cache_dir=CACHE_DIR, variables=None):
+    # Payload dikompilasi sebelum koneksi dibuka, jadi pengirim di front-end hanya menelusuri program
+    # lewat iter_from, tanpa parsing saat link aktif. variables mengisi placeholder {{NAME}} pada template
+    program = precompile_payload(filename, layout, cache_dir, variables)
+    if isinstance(program, TemplatePayload):
+        program = program.fill(variables or {})
+    return program
+
+def precompile_payload(filename, layout='us', cache_dir=CACHE_DIR, variables=None):
+    # Sama dengan load_compiled_payload, tetapi template dikembalikan tanpa diisi
+    if not os.path.exists(filename):
+        log.warning(f"File {filename} not found. Skipping DuckyScript.")
+        return None
+    variables = variables or {}
+    key = cache_key(filename, layout)
+    path = cache_path(key, cache_dir)
+    vm_path = cache_path(key, cache_dir, 'vm')
+    template_path = cache_path(key, cache_dir, 'tpl')
+    if os.path.exists(path):
+        try:
+            log.debug(f"Using compiled payload cache {path}")
+            return MappedPayload(path)
+        except ValueError as e:
+            log.warning(f"{e}, recompiling")
+    if os.path.exists(vm_path):
+        log.debug(f"Using compiled payload cache {vm_path}")
+        with open(vm_path, 'rb') as file:
+            return pickle.load(file)
+    if os.path.exists(template_path):
+        log.debug(f"Using compiled payload cache {template_path}")
+        with open(template_path, 'rb') as file:
+            return pickle.load(file)
+
+    stringfile, control_flow, template = _payload_features(filename)
+    if stringfile or (template and control_flow):
+        # Isi file STRINGFILE dan nilai template tidak ikut dalam kunci cache, jadi payload ini
+        # selalu dikompilasi ulang dari teks yang sudah disubstitusi
+        log.debug("Payload uses STRINGFILE or a DuckyScript 3 template, skipping the compiled payload cache")
+        lines = lambda: _payload_lines(filename, variables if template else None)
+        if control_flow:
+            return compile_program(lines(), layout)
+        return compile_duckyscript(lines(), layout)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Line cache per path juga mencatat file program terakhir, jadi selalu dimuat; template dan payload
+    # besar tidak dikompilasi per baris dan hanya memakai catatan itu
+    line_cache = load_line_cache(filename, layout, cache_dir)
+    if template or os.path.getsize(filename) > LINE_CACHE_MAX_SOURCE:
+        compiled_lines = None
+    else:
+        compiled_lines = line_cache
+    if template:
+        program = compile_template(_payload_lines(filename), layout)
+        tmp_path = _tmp_path(template_path)
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(program, file)
+        os.replace(tmp_path, template_path)
+        stored = template_path
+    elif control_flow:
+        program = compile_program(_payload_lines(filename), layout, compiled_lines)
+        tmp_path = _tmp_path(vm_path)
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(program, file)
+        os.replace(tmp_path, vm_path)
+        stored = vm_path
+    else:
+        if compiled_lines is None:
+            write_compiled_payload(path, iter_reports(_payload_lines(filename), layout), report_slot())
+        else:
+            write_spliced_payload(path, _payload_lines(filename), compiled_lines, report_slot())
+        program = MappedPayload(path)
+        stored = path
+    log.debug(f"Stored compiled payload in {stored}")
+    replace_program(line_cache, stored)
+    if compiled_lines is not None:
+        log.debug(f"Recompiled {line_cache.misses} changed lines")
+    save_line_cache(line_cache, filename, cache_dir)
+    return program
@@ -0,0 +1,113 @@
+import re
+
+from utils.duckyscript_compiler import CompiledPayload, compile_line, compile_string, start_block
+from utils.duckyscript_vm import DuckyScriptError
+
+# Placeholder template, misalnya: STRING https://{{HOST}}/login
+PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+
+# Jenis slot: nilai diketik langsung (bagian dari STRING/STRINGLN) atau seluruh baris dikompilasi ulang
+SLOT_STRING = 0
+SLOT_LINE = 1
+
+
+def has_placeholder(line):
+    return not line.startswith("REM") and PLACEHOLDER.search(line) is not None
+
+def _value(variables, name):
+    if name not in variables:
+        raise DuckyScriptError(f"Missing value for template slot {{{{{name}}}}}, use --var {name}=...")
+    return variables[name]
+
+def substitute(line, variables):
+    # Substitusi teks biasa, untuk payload yang tidak bisa memakai template terkompilasi
+    if not has_placeholder(line):
+        return line
+    return PLACEHOLDER.sub(lambda match: _value(variables, match.group(1)), line)
+
+
+class SegmentedPayload:
+    # Program yang disambung dari beberapa blok tanpa menyalin report-nya.
+    # parts berisi [blok, delay tambahan setelah report terakhir blok]
+    def __init__(self, parts):
+        self.parts = parts
+        self.count = sum(len(block) for block, _ in parts)
+
+    def __len__(self):
+        return self.count
+
+    def iter_from(self, index=0):
+        base = 0
+        for block, extra in self.parts:
+            size = len(block)
+            if base + size > index:
+                last = size - 1
+                for i, report, delay in block.iter_from(max(index - base, 0)):
+                    yield base + i, report, (delay + extra) if i == last else delay
+            base += size
+
+    def total_duration(self):
+        return sum(block.total_duration() + extra for block, extra in self.parts)
+
+
+class TemplatePayload:
+    # Payload dengan placeholder: bagian tetap sudah dikompilasi, hanya slot yang di-encode saat diisi
+    def __init__(self, layout, segments):
+        self.layout = layout
+        self.segments = segments
+
+    def slots(self):
+        names = set()
+        for segment in self.segments:
+            if isinstance(segment, tuple):
+                kind, data = segment
+                names.update([data] if kind == SLOT_STRING else PLACEHOLDER.findall(data))
+        return names
+
+    def fill(self, variables):
+        parts = []
+        for segment in self.segments:
+            if isinstance(segment, tuple):
+                kind, data = segment
+                block = CompiledPayload()
+                if kind == SLOT_STRING:
+                    compile_string(block, _value(variables, data), self.layout)
+                else:
+                    compile_line(block, substitute(data, variables), self.layout)
+            else:
+                block = segment
+            # DELAY di awal blok ditambahkan ke report terakhir blok sebelumnya
+            if block.leading_delay and parts:
+                parts[-1][1] += block.leading_delay
+            if block:
+                parts.append([block, 0.0])
+        return SegmentedPayload(parts)
+
+
+def compile_template(duckyscript, layout='us'):
+    segments = []
+    current = start_block()
+    for line in duckyscript:
+        line = line.strip()
+        if not has_placeholder(line):
+            compile_line(current, line, layout)
+            continue
+        segments.append(current)
+        command, _, argument = line.partition(" ")
+        if command in ('STRING', 'STRINGLN'):
+            # Teks di sekitar placeholder ikut dikompilasi sekarang, hanya nilainya yang menunggu
+            current = CompiledPayload()
+            for position, part in enumerate(PLACEHOLDER.split(argument)):
+                if position % 2:
+                    segments.append(current)
+                    segments.append((SLOT_STRING, part))
+                    current = CompiledPayload()
+                else:
+                    compile_string(current, part, layout)
+            if command == 'STRINGLN':
+                compile_line(current, "ENTER", layout)
+        else:
+            segments.append((SLOT_LINE, line))
+            current = CompiledPayload()
+    segments.append(current)
+    return TemplatePayload(layout, segments)
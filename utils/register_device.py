@@ -4,6 +4,8 @@ import dbus.mainloop.glib
 from gi.repository import GLib
 import logging as log
 
+from utils.hid_descriptor import HID_DESCRIPTORS
+
 class Agent(dbus.service.Object):
   @dbus.service.method("org.bluez.Agent1", in_signature="", out_signature="")
   def Cancel(self):
@@ -29,7 +31,7 @@ def agent_loop(target_path):
   loop.run()
 
 
-def register_hid_profile(iface, addr):
+def register_hid_profile(iface, addr, report_mode='boot'):
     dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
     bus = dbus.SystemBus()
     get_obj = lambda path, iface: dbus.Interface(bus.get_object("org.bluez", path), iface)
@@ -168,7 +170,7 @@ def register_hid_profile(iface, addr):
 		<sequence>
 			<sequence>
 				<uint8 value="0x22" />
-				<text encoding="hex" value="05010906a101850105071500250119e029e775019508810295057501050819012905910295017503910395087501150025010600ff09038103950675081500256505071900296581009501750115002501050c09008101950175010601ff09038102050c09409501750181029501750581030602ff09558555150026ff0075089540b1a2c00600ff0914a101859005847501950315002501096105850944094681029505810175089501150026ff0009658102c00600ff094ba1010600ff094b150026ff008520956b75088102094b852196890275088102094b8522953e75088102c0" />
+				<text encoding="hex" value="%s" />
 			</sequence>
 		</sequence>
 	</attribute>
@@ -212,7 +214,7 @@ def register_hid_profile(iface, addr):
 	<attribute id="0x020e">
 		<boolean value="true" />
 	</attribute>
-</record>"""
+</record>""" % HID_DESCRIPTORS[report_mode]
 
 
     opts = {"ServiceRecord": xml_content}
@@ -0,0 +1,136 @@
+import logging as log
+import threading
+import time
+
+from utils.l2cap_io import SocketPoller, send_when_writable
+
+RING_CAPACITY = 1024
+SEND_TIMEOUT = 0.5
+# Thread yang sedang memegang GIL (event loop atau producer yang mengompilasi) baru melepasnya setelah
+# switch interval, default 5 ms. Selama sender berjalan pemiliknya (HIDEngine) memperkecil interval
+# supaya sender bangun tepat waktu
+SWITCH_INTERVAL = 0.0005
+
+
+def next_position(index):
+    # Posisi resume setelah report pada index terkirim. index berupa indeks report program, atau di mode
+    # streaming (byte offset baris, offset di STRINGFILE, indeks report di blok baris itu)
+    if isinstance(index, tuple):
+        offset, file_offset, report = index
+        return offset, file_offset, report + 1
+    return index + 1
+
+
+class ReportRing:
+    # Antrian report berukuran tetap. Slot dialokasikan sekali; producer dan sender hanya memindah indeks,
+    # report sendiri adalah objek bytes yang sudah di-intern encoder
+    def __init__(self, capacity=RING_CAPACITY):
+        self.capacity = capacity
+        self.indexes = [None] * capacity
+        self.reports = [None] * capacity
+        self.delays = [0.0] * capacity
+        # head: slot berikutnya yang dikirim, count: jumlah slot terisi
+        self.head = 0
+        self.count = 0
+        self.closed = False
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+
+    def put(self, index, report, delay):
+        # False jika ring penuh; producer menunggu lewat wait_space() lalu mencoba lagi
+        with self.lock:
+            if self.count == self.capacity:
+                return False
+            slot = (self.head + self.count) % self.capacity
+            self.indexes[slot] = index
+            self.reports[slot] = report
+            self.delays[slot] = delay
+            self.count += 1
+            if self.count == 1:
+                self.changed.notify_all()
+            return True
+
+    def peek(self):
+        # Slot terdepan (indeks, report, jeda), menunggu sampai ada isi; None jika ring ditutup
+        with self.lock:
+            while not self.count and not self.closed:
+                self.changed.wait()
+            if self.closed:
+                return None
+            return self.indexes[self.head], self.reports[self.head], self.delays[self.head]
+
+    def pop(self):
+        with self.lock:
+            self.reports[self.head] = None
+            self.head = (self.head + 1) % self.capacity
+            self.count -= 1
+            # Producer dibangunkan per setengah ring, bukan per report
+            if self.count == self.capacity // 2 or not self.count:
+                self.changed.notify_all()
+
+    def wait_space(self):
+        with self.lock:
+            while self.count > self.capacity // 2 and not self.closed:
+                self.changed.wait()
+
+    def wait_empty(self):
+        with self.lock:
+            while self.count and not self.closed:
+                self.changed.wait()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.changed.notify_all()
+
+
+class ReportSender(threading.Thread):
+    # Satu-satunya pengirim di kanal interrupt: mengambil report dari ReportRing dan mengirimnya pada
+    # waktu yang dijadwalkan. Tidak ada logging, encoding atau parsing di thread ini, jadi jarak antar
+    # report hanya dipengaruhi penjadwal dan radio
+    def __init__(self, sock, ring):
+        super().__init__(daemon=True)
+        self.sock = sock
+        self.ring = ring
+        self.stopping = threading.Event()
+        self.sent = 0
+        self.dropped = 0
+        self.error = None
+        # Posisi report program yang belum terkirim (lihat next_position), untuk resume setelah reconnect
+        self.next_index = None
+
+    def stop(self, timeout=1):
+        self.stopping.set()
+        self.ring.close()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        poller = SocketPoller(self.sock)
+        ring = self.ring
+        deadline = time.monotonic()
+        while True:
+            entry = ring.peek()
+            if entry is None:
+                return
+            index, report, delay = entry
+            if index is not None:
+                self.next_index = index
+            # Jeda dijadwalkan pada waktu absolut; report yang terlambat mengulang jadwal dari sekarang
+            now = time.monotonic()
+            if deadline > now and self.stopping.wait(deadline - now):
+                return
+            deadline = max(deadline, now) + delay
+            try:
+                if send_when_writable(self.sock, poller, report, SEND_TIMEOUT):
+                    self.sent += 1
+                else:
+                    self.dropped += 1
+                    log.warning(f"[TX-19] Link busy for {SEND_TIMEOUT}s, report dropped: {report.hex()}")
+            except OSError as ex:
+                self.error = ex
+                ring.close()
+                return
+            if index is not None:
+                self.next_index = next_position(index)
+            ring.pop()